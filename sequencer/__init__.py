@@ -15,9 +15,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def create_app(test_config=None):
+def create_app(test_config=None, instance_path=None):
     # create and configure the app
-    app = Flask(__name__, instance_relative_config=True, static_folder='static')
+    app = Flask(__name__, instance_path=instance_path, instance_relative_config=True, static_folder='static')
     app.config.from_object('sequencer.default_settings')
     app.config.from_mapping(
         SECRET_KEY='dev',
@@ -28,7 +28,8 @@ def create_app(test_config=None):
         SQLALCHEMY_DATABASE_URI="sqlite:///%s" % os.path.join(app.instance_path, 'sequencer.sqlite'),
         SQLALCHEMY_TRACK_MODIFICATIONS=False
     )
-    app.config.from_pyfile('application.cfg', silent=False)
+    # the local credentials (see the README) are required, except by tests, which pass their own
+    app.config.from_pyfile('application.cfg', silent=test_config is not None)
 
     #print('config: {}'.format(app.config))
     # allow the dev server to hit our api, too
@@ -36,7 +37,7 @@ def create_app(test_config=None):
     # also enable caching backend
     cache.init_app(app, config={
         'CACHE_DIR': os.path.join(app.instance_path, 'cache'),
-        'CACHE_TYPE': "filesystem"
+        'CACHE_TYPE': "sequencer.cache.TieredCache"
     })
 
     if test_config is None:
@@ -56,6 +57,20 @@ def create_app(test_config=None):
     from . import db
     db.db.init_app(app)
     app.cli.add_command(db.init_db_command)
+    with app.app_context():
+        db.add_missing_columns()
+
+    # load (or start building) the precomputed example windows
+    from .support import example_table
+    example_table.init_app(app)
+
+    # background BLAST jobs
+    from .support import blast_jobs
+    blast_jobs.init_app(app)
+
+    # the local BLAST database and its build command
+    from .support import blast_db
+    blast_db.init_app(app)
 
     # inject api endpoints
     from . import api
@@ -1,8 +1,6 @@
 import random
 from uuid import uuid4
 
-import requests
-
 from flask import (
     Blueprint, request, jsonify,
     json,
@@ -13,15 +11,17 @@ from flask import (
 )
 
 from sequencer import cache
-from sequencer.default_settings import MOCK_BLAST_HAS_RESULTS, USE_GIS_CACHING, BLAST_TIMEOUT
+from sequencer.cache import cache_stats
+from sequencer.default_settings import BLAST_JOB_POLL_MAX_SECS, MOCK_BLAST_HAS_RESULTS, USE_GIS_CACHING
 from sequencer.support import ev3_reader
 from sequencer.db import db
 from sequencer.models import Sequence, TaxonNames
-from sequencer.support.blaster import blast_sequence, blast_sequence_local
+from sequencer.support import blast_jobs, http_client, step_log
+from sequencer.support.blaster import blast_sequence_local
 from sequencer.support.ev3_reader import query_full_sequence
 from sequencer.support.rag import generate_reflection
 from sequencer.support.translations import get_translation
-from sequencer.support.alignment import query_sequence
+from sequencer.support.alignment import query_sequence, query_sequences, query_cache_info, unfreeze
 from logging import getLogger
 logger = getLogger(__name__)
 
@@ -40,7 +40,7 @@ EXAMPLE_SPECIES_IMAGES = {
 
 class APIBlueprint(Blueprint):
     def register(self, app, options, first_registration=False):
-        global GCE_KEY, GCE_PROJECT_CX, OPENROUTER_API_KEY
+        global GCE_KEY, GCE_PROJECT_CX, OPENROUTER_API_KEY, BLAST_DB_DIR
 
         config = app.config
         GCE_KEY = config.get('GCE_KEY')
@@ -66,6 +66,11 @@ def ping():
     return jsonify({'msg': 'pong!'})
 
 
+@bp.route('/stats')
+def stats():
+    return jsonify({'query_cache': query_cache_info(), 'cache': cache_stats(), 'step_log': step_log.stats()})
+
+
 # ------------------------------------------------------
 # --- LEGO Brick Comm.
 # ------------------------------------------------------
@@ -73,7 +78,19 @@ def ping():
 @bp.route('/nudge/<direction>', defaults={'amount': 1})
 @bp.route('/nudge/<direction>/<amount>')
 def nudge(direction, amount):
-    return jsonify(ev3_reader.nudge(direction, amount=float(amount)))
+    try:
+        return jsonify(ev3_reader.nudge(direction, amount=float(amount)))
+    except ev3_reader.FatalDisconnectException as ex:
+        return make_response(jsonify({'error': str(ex)}), 503)
+
+
+@bp.route('/ev3/health')
+def ev3_health():
+    """
+    Reports on the connection to the brick; 503 while it's down.
+    """
+    state = ev3_reader.health()
+    return make_response(jsonify(state), 200 if state['connected'] else 503)
 
 
 @bp.route('/query_ev3')
@@ -126,38 +143,93 @@ def query_ev3():
 # --- BLAST proxy
 # ------------------------------------------------------
 
-@bp.route('/blast')
-def blast():
-    try:
-        sequence = request.args['sequence']
-        lang = request.args.get('lang', 'en')
-    except KeyError:
-        return jsonify({'error': 'must specify a sequence'})
-
+def relay_job(job, after=0):
     def g():
-        gen = blast_sequence(sequence, lang=lang, timeout=BLAST_TIMEOUT)
         not_first = False
         yield "["
-        for rec in gen:
+        for rec in blast_jobs.relay(job, after):
             if not_first:
                 yield ","
             not_first = True
             yield json.dumps(rec)
         yield "]"
 
-    # incrementally yields json objects
+    # incrementally yields json objects as the job produces them
     return Response(stream_with_context(g()))
 
 
+@bp.route('/blast')
+def blast():
+    try:
+        sequence = request.args['sequence']
+        lang = request.args.get('lang', 'en')
+    except KeyError:
+        return jsonify({'error': 'must specify a sequence'})
+
+    # the job keeps going (and fills the cache) even if the client goes away; a client that comes back with the
+    # same query_id (or sequence) resumes its search at NCBI
+    job = blast_jobs.submit(sequence, lang=lang, query_id=request.args.get('query_id', type=int))
+    return relay_job(job)
+
+
+@bp.route('/blast/jobs', methods=['POST'])
+def submit_blast_job():
+    payload = request.get_json(silent=True)
+    if not isinstance(payload, dict):
+        payload = request.form
+    sequence = payload.get('sequence')
+    if not sequence or not isinstance(sequence, str):
+        return make_response(jsonify({'error': 'must specify a sequence'}), 400)
+
+    # a number, or a string of digits from a form
+    query_id = payload.get('query_id') or None
+    if query_id is not None:
+        if isinstance(query_id, bool) or not str(query_id).isdigit():
+            return make_response(jsonify({'error': 'query_id must be a whole number'}), 400)
+        query_id = int(query_id)
+
+    job = blast_jobs.submit(sequence, lang=payload.get('lang', 'en'), query_id=query_id)
+    return make_response(jsonify(job.as_dict()), 202)
+
+
+@bp.route('/blast/jobs/<job_id>')
+def get_blast_job(job_id):
+    """
+    Returns the job's events so far; pass ?after=<n> to skip the n events already seen, and ?timeout=<seconds> to
+    wait up to that long (at most BLAST_JOB_POLL_MAX_SECS) for more if there are none yet.
+    """
+    job = blast_jobs.get_job(job_id)
+    if job is None:
+        return make_response(jsonify({'error': 'no such job'}), 404)
+
+    after = request.args.get('after', 0, type=int)
+    timeout = min(request.args.get('timeout', 0, type=float), BLAST_JOB_POLL_MAX_SECS)
+    if timeout > 0:
+        blast_jobs.wait_for_events(job, after, timeout)
+    return jsonify(job.as_dict(after))
+
+
+@bp.route('/blast/jobs/<job_id>/stream')
+def stream_blast_job(job_id):
+    """
+    Streams the job's events like /api/blast does, starting after the first ?after=<n> of them.
+    """
+    job = blast_jobs.get_job(job_id)
+    if job is None:
+        return make_response(jsonify({'error': 'no such job'}), 404)
+    return relay_job(job, request.args.get('after', 0, type=int))
+
+
 @bp.route('/local_blast')
 def local_blast():
     try:
         sequence = request.args['sequence']
+        lang = request.args.get('lang', 'en')
     except KeyError:
         return jsonify({'error': 'must specify a sequence'})
 
     def g():
-        gen = blast_sequence_local(sequence, blast_db_dir=BLAST_DB_DIR)
+        gen = blast_sequence_local(sequence, blast_db_dir=BLAST_DB_DIR, lang=lang)
         not_first = False
         yield "["
         for rec in gen:
@@ -171,6 +243,35 @@ def local_blast():
     return Response(stream_with_context(g()))
 
 
+# ------------------------------------------------------
+# --- example alignment
+# ------------------------------------------------------
+
+@bp.route('/align_batch', methods=['POST'])
+def align_batch():
+    """
+    Matches many reads against the examples at once, e.g. to re-score the stored sequences.
+    Expects {"reads": [<sequence>, ...]}, returns {"results": [...]} in the same order.
+    """
+    payload = request.get_json(silent=True)
+    reads = payload.get('reads') if isinstance(payload, dict) else None
+    if not isinstance(reads, list) or not all(isinstance(read, str) for read in reads):
+        return jsonify({'error': 'must specify a list of reads'}), 400
+
+    try:
+        results = query_sequences(reads)
+    except Exception as ex:
+        current_app.logger.exception("Batch alignment failed")
+        return make_response(jsonify({
+            'error': str(ex)
+        }), 500)
+
+    fields = ('example', 'gene', 'variants', 'protein_variants', 'domains', 'blast')
+    return jsonify({
+        'results': [dict(zip(fields, unfreeze(result))) for result in results]
+    })
+
+
 # ------------------------------------------------------
 # --- GIS species images
 # ------------------------------------------------------
@@ -207,9 +308,9 @@ def species_img():
     current_app.logger.debug("Google Image Search → %s?%s", url, params.get('q', ''))
 
     try:
-        resp = requests.get(url, params=params, timeout=5)
+        resp = http_client.get(url, params=params, timeout=5)
         resp.raise_for_status()
-    except requests.RequestException as e:
+    except http_client.RequestException as e:
         current_app.logger.error("Google API request failed [%s]: %s", getattr(e.response, "status_code", None), e)
         return jsonify(results=[]), 502
 
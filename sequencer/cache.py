@@ -1,3 +1,271 @@
+"""
+The app's cache, a Flask-Caching backend with two tiers.
+
+Values are kept pickled in a small in-memory LRU, bounded by their total size in bytes, in front of a filesystem
+cache that's shared between processes. Reads that miss the memory tier fall through to the disk tier and are copied
+back into memory; writes go to both. Since other processes only write to the disk tier, a memory copy is kept for at
+most CACHE_MEMORY_TTL_SECS, and keys in the CACHE_SHARED_PREFIXES namespaces, which several processes read, modify and
+write back, skip the memory tier altogether.
+
+Entries set without an explicit timeout expire after the TTL of the namespace their key starts with (see CACHE_TTLS).
+A background thread keeps the cache directory under CACHE_DISK_BYTES, removing expired entries first and then the
+least recently written ones.
+"""
+import os
+import pickle
+import struct
+import threading
+from collections import OrderedDict
+from time import sleep, time
+
+from cachelib import FileSystemCache
 from flask_caching import Cache
+from flask_caching.backends.base import BaseCache
+
+import logging
+logger = logging.getLogger(__name__)
 
 cache = Cache()
+
+
+class MemoryTier:
+    """
+    An LRU of pickled values with expiry times, holding at most 'max_bytes' of them.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (expires, pickled value); expires is 0 for never
+        self.bytes = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns the pickled value for key, or None if it's missing or expired.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, data = entry
+            if expires and expires <= time():
+                self._remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return data
+
+    def set(self, key, data, expires):
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            # values that'd take up most of the tier just live on disk
+            if len(data) > self.max_bytes // 2:
+                return
+            self.entries[key] = (expires, data)
+            self.bytes += len(data)
+            while self.bytes > self.max_bytes:
+                self._remove(next(iter(self.entries)))
+                self.evictions += 1
+
+    def delete(self, key):
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.bytes = 0
+
+    def _remove(self, key):
+        _, data = self.entries.pop(key)
+        self.bytes -= len(data)
+
+
+class TieredCache(BaseCache):
+    """
+    A MemoryTier in front of a cachelib FileSystemCache, see the module docstring.
+    """
+
+    def __init__(self, cache_dir, memory_bytes, disk_bytes, ttls=None, eviction_interval=600, default_timeout=300,
+                 memory_ttl=300, shared_prefixes=()):
+        super().__init__(default_timeout=default_timeout)
+        # longest prefixes first, so the most specific namespace wins
+        self.ttls = sorted((ttls or {}).items(), key=lambda item: -len(item[0]))
+        self.memory = MemoryTier(memory_bytes)
+        self.memory_ttl = memory_ttl
+        self.shared_prefixes = tuple(shared_prefixes)
+        # threshold=0 leaves the size limit to the eviction thread, rather than a per-process count of entries
+        self.disk = FileSystemCache(cache_dir, threshold=0, default_timeout=default_timeout)
+        self.cache_dir = cache_dir
+        self.disk_bytes = disk_bytes
+        self.eviction_interval = eviction_interval
+
+        self.stats_lock = threading.Lock()
+        self.counts = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'disk_evictions': 0, 'disk_expired': 0}
+        self.disk_size = None  # as of the last eviction pass
+
+        if eviction_interval:
+            threading.Thread(target=self._run_eviction, name='cache-eviction', daemon=True).start()
+
+    @classmethod
+    def factory(cls, app, config, args, kwargs):
+        kwargs.update(
+            cache_dir=config['CACHE_DIR'],
+            memory_bytes=config['CACHE_MEMORY_BYTES'],
+            disk_bytes=config['CACHE_DISK_BYTES'],
+            ttls=config['CACHE_TTLS'],
+            eviction_interval=config['CACHE_EVICTION_INTERVAL_SECS'],
+            memory_ttl=config['CACHE_MEMORY_TTL_SECS'],
+            shared_prefixes=config['CACHE_SHARED_PREFIXES'],
+        )
+        return cls(*args, **kwargs)
+
+    def _timeout(self, key, timeout):
+        if timeout is None:
+            for prefix, ttl in self.ttls:
+                if key.startswith(prefix):
+                    return ttl
+        return self._normalize_timeout(timeout)
+
+    def _memory_expires(self, key, timeout):
+        """
+        Returns when the memory copy of key, set with the given TTL, expires, or None if it isn't kept in memory.
+        """
+        if key.startswith(self.shared_prefixes):
+            return None
+        ttls = [ttl for ttl in (timeout, self.memory_ttl) if ttl]
+        return time() + min(ttls) if ttls else 0
+
+    def _count(self, name, n=1):
+        with self.stats_lock:
+            self.counts[name] += n
+
+    def get(self, key):
+        data = self.memory.get(key)
+        if data is not None:
+            self._count('memory_hits')
+            return pickle.loads(data)
+
+        value = self.disk.get(key)
+        if value is None:
+            self._count('misses')
+            return None
+        self._count('disk_hits')
+        # the disk tier doesn't say when the entry expires, so the memory copy may outlive it by up to memory_ttl
+        expires = self._memory_expires(key, self._timeout(key, None))
+        if expires is not None:
+            self.memory.set(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires)
+        return value
+
+    def set(self, key, value, timeout=None):
+        timeout = self._timeout(key, timeout)
+        expires = self._memory_expires(key, timeout)
+        if expires is not None:
+            self.memory.set(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), expires)
+        return self.disk.set(key, value, timeout)
+
+    def add(self, key, value, timeout=None):
+        if self.has(key):
+            return False
+        return self.set(key, value, timeout)
+
+    def delete(self, key):
+        self.memory.delete(key)
+        return self.disk.delete(key)
+
+    def has(self, key):
+        return self.memory.get(key) is not None or self.disk.has(key)
+
+    def clear(self):
+        self.memory.clear()
+        return self.disk.clear()
+
+    def stats(self):
+        """
+        Returns the hit counts and hit rate of each tier, and how much each holds.
+        """
+        with self.stats_lock:
+            counts = dict(self.counts)
+        lookups = counts['memory_hits'] + counts['disk_hits'] + counts['misses']
+        disk_lookups = counts['disk_hits'] + counts['misses']
+        return {
+            'lookups': lookups,
+            'memory': {
+                'hits': counts['memory_hits'],
+                'hit_rate': counts['memory_hits'] / lookups if lookups else None,
+                'entries': len(self.memory.entries),
+                'bytes': self.memory.bytes,
+                'max_bytes': self.memory.max_bytes,
+                'evictions': self.memory.evictions,
+            },
+            'disk': {
+                'hits': counts['disk_hits'],
+                'hit_rate': counts['disk_hits'] / disk_lookups if disk_lookups else None,
+                'bytes': self.disk_size,
+                'max_bytes': self.disk_bytes,
+                'evictions': counts['disk_evictions'],
+                'expired': counts['disk_expired'],
+            },
+            'misses': counts['misses'],
+        }
+
+    def _run_eviction(self):
+        while True:
+            sleep(self.eviction_interval)
+            try:
+                self.evict()
+            except Exception:
+                logger.exception("Cache eviction failed")
+
+    def evict(self):
+        """
+        Removes the disk tier's expired entries, then its oldest ones until it's under 90% of its size limit.
+        """
+        now = time()
+        entries = []  # (mtime, size, path)
+        for entry in os.scandir(self.cache_dir):
+            # skips cachelib's own bookkeeping files and other processes' half-written entries
+            if not entry.is_file() or entry.name.startswith('__') or entry.name.endswith('.__wz_cache'):
+                continue
+            try:
+                stat = entry.stat()
+                with open(entry.path, 'rb') as f:
+                    expires = struct.unpack('I', f.read(4))[0]
+            except (OSError, struct.error):
+                continue
+            if expires and expires < now:
+                self._remove_file(entry.path, 'disk_expired')
+            else:
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+        size = sum(size for _, size, _ in entries)
+        if size > self.disk_bytes:
+            entries.sort()
+            target = self.disk_bytes * 0.9
+            removed = 0
+            for _, file_size, path in entries:
+                if size <= target:
+                    break
+                if self._remove_file(path, 'disk_evictions'):
+                    size -= file_size
+                    removed += 1
+            logger.info("Evicted %d cache entries, %d bytes left on disk", removed, size)
+        self.disk_size = size
+
+    def _remove_file(self, path, counter):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return False
+        self._count(counter)
+        return True
+
+
+def cache_stats():
+    """
+    Returns the app cache's per-tier stats, or None if it isn't a TieredCache.
+    """
+    backend = cache.cache
+    return backend.stats() if isinstance(backend, TieredCache) else None
@@ -8,6 +8,27 @@ from sequencer.default_settings import LOAD_TAXON_DATA
 db = SQLAlchemy()
 
 
+def add_missing_columns():
+    """
+    Adds columns that were added to the models since their tables were created; create_all() leaves existing tables
+    alone. New columns must be nullable.
+    """
+    import sequencer.models
+    inspector = db.inspect(db.engine)
+    existing_tables = set(inspector.get_table_names())
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing = {column['name'] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in existing:
+                current_app.logger.info("Adding column %s.%s", table.name, column.name)
+                with db.engine.begin() as conn:
+                    conn.execute(db.text('ALTER TABLE %s ADD COLUMN %s %s' % (
+                        table.name, column.name, column.type.compile(db.engine.dialect)
+                    )))
+
+
 @click.command('init-db')
 @with_appcontext
 def init_db_command():
@@ -15,6 +36,7 @@ def init_db_command():
     import sequencer.models
     print('Initializing the database...')
     db.create_all()
+    add_missing_columns()
     click.echo('Initialized the database.')
 
     if LOAD_TAXON_DATA:
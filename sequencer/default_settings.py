@@ -12,6 +12,20 @@ TIME_MOD = 0.1
 # if MOCK_COMM=True and if USE_RANDOM_SEQ=True, uses a random sequence of {A,C,T,G} instead of a sample sequence
 USE_RANDOM_SEQ = False
 
+# -----------------------------------
+# --- LEGO brick connection
+# -----------------------------------
+
+# the brick's rpyc server
+EV3_HOST = 'ev3dev.local'
+
+# the connection is checked this often with a ping, and reconnected if the ping fails
+EV3_HEARTBEAT_SECS = 5
+EV3_PING_TIMEOUT_SECS = 2
+
+# failed reconnects are retried after 1, 2, 4... seconds, up to this long
+EV3_RECONNECT_MAX_BACKOFF_SECS = 60
+
 
 # -----------------------------------
 # --- NCBI BLAST:
@@ -24,6 +38,39 @@ BLAST_TIMEOUT = 120
 # set to 0 to disable the minimum
 MIN_POLL_DELAY_SECS = 0
 
+# the submit-to-READY durations of earlier searches with the same parameters and query length time the polls of a new
+# one: the first at the first of these quantiles, then at each of the others, then whenever NCBI says to
+BLAST_POLL_QUANTILES = (0.5, 0.8, 0.95)
+
+# how many of the latest durations are kept for the above, and how many are needed before they're used
+BLAST_TIMING_SAMPLES = 50
+BLAST_TIMING_MIN_SAMPLES = 5
+
+# number of threads that run the steps of BLAST jobs (submitting, polling, fetching results); jobs don't hold a
+# thread while they wait, so this bounds concurrent requests to NCBI, not concurrent jobs
+BLAST_JOB_WORKERS = 4
+
+# time in seconds a finished BLAST job's events are kept for clients to fetch
+BLAST_JOB_TTL_SECS = 60 * 60
+
+# longest a poll for a BLAST job's events may wait for new ones, in seconds; it holds a server thread meanwhile
+BLAST_JOB_POLL_MAX_SECS = 2
+
+# requests arriving within this many seconds of the first are sent to NCBI as one multi-query search, whose
+# results are split up again; NCBI asks for no more than one request every two seconds
+BLAST_BATCH_WINDOW_SECS = 2
+
+# maximum number of query sequences in one search; a full batch is sent without waiting for the window to close
+BLAST_BATCH_MAX_QUERIES = 10
+
+# if true, requests for a sequence that's already being searched (by this or another worker process) follow that
+# search instead of submitting another one to NCBI
+COALESCE_BLAST_REQUESTS = True
+
+# how long NCBI keeps a search's results; a client asking again for a sequence (or query_id) whose search was
+# submitted less than this long ago resumes polling it instead of submitting another one
+BLAST_RID_LIFETIME_SECS = 24 * 60 * 60
+
 # if true, mocks the NCBI blast request process and returns a canned result
 MOCK_BLAST = False
 
@@ -51,6 +98,92 @@ BLAST_PARAMS = {
 LOAD_TAXON_DATA = False
 
 
+# -----------------------------------
+# --- BLAST step logs
+# -----------------------------------
+
+# NCBI's responses to each step of a search are archived here (if blaster.LOG_STEPS is on), see step_log
+STEP_LOG_DIR = "logs"
+
+# responses waiting to be written beyond this many are dropped rather than holding up the request
+STEP_LOG_QUEUE_SIZE = 256
+
+# a new archive segment is started each day, or once the current one is this big (compressed)
+STEP_LOG_SEGMENT_BYTES = 8 * 1024 * 1024
+
+# the oldest segments are removed when they add up to more than this
+STEP_LOG_MAX_BYTES = 256 * 1024 * 1024
+
+# -----------------------------------
+# --- Local BLAST
+# -----------------------------------
+
+# /api/local_blast searches the database in the BLAST_DB_DIR set in instance/application.cfg, using the scoring in
+# BLAST_PARAMS; build it from FASTA files (.fa, .fasta, .fna, optionally gzipped) with 'flask build-blast-db'
+
+# length of the exact word matches that seed an alignment; this is the k-mer size of the database's index, so
+# changing it requires rebuilding the database
+LOCAL_BLAST_WORD_SIZE = 11
+
+# number of bases indexed at a time while building the database; memory use during the build grows with this
+LOCAL_BLAST_BUILD_CHUNK = 4 * 1024 * 1024
+
+# an ungapped extension stops once its score falls this far below the best score seen so far
+LOCAL_BLAST_XDROP = 20
+
+# minimum score of an ungapped extension for it to be re-aligned with gaps
+LOCAL_BLAST_MIN_UNGAPPED_SCORE = 14
+
+# number of worker processes searching the database's shards in parallel, None for one per CPU
+LOCAL_BLAST_WORKERS = None
+
+# number of shards the database is split into, None for two per worker; the best hits so far are streamed to the
+# client whenever a shard finishes
+LOCAL_BLAST_SHARDS = None
+
+# databases shorter than this many bases per shard get fewer shards, and those that would get only one are searched
+# without the worker processes
+LOCAL_BLAST_MIN_SHARD_LENGTH = 1024 * 1024
+
+
+# -----------------------------------
+# --- Example matching
+# -----------------------------------
+
+# if true, reads that are in-frame windows of an example (optionally with a few substituted bricks) are answered
+# from a precomputed table instead of being aligned; the table is saved to the instance folder and loaded from there
+# on later starts, or built with 'flask build-example-table'
+USE_EXAMPLE_TABLE = True
+
+# read lengths for which example windows are precomputed (the mock sequencer produces 22 bases, the full tray 28)
+EXAMPLE_TABLE_READ_LENGTHS = (22, 28)
+
+# maximum number of substituted bases in the precomputed windows (0, 1 or 2)
+EXAMPLE_TABLE_MAX_SUBSTITUTIONS = 1
+
+# approximate upper bound on the table's memory use in bytes; a number of substitutions whose windows would go past it
+# is left out as a whole (each read takes 16 bytes: the windows alone about 0.25 MB, those with one substitution about
+# 18 MB more, those with two about 670 MB more)
+EXAMPLE_TABLE_MAX_BYTES = 64 * 1024 * 1024
+
+
+# -----------------------------------
+# --- Outgoing requests
+# -----------------------------------
+
+# maximum number of kept-alive connections per host
+HTTP_POOL_SIZE = 16
+
+# time in seconds to wait for a host to respond, unless the request specifies its own
+HTTP_TIMEOUT_SECS = 30
+
+# minimum time in seconds between requests to each of these hosts, across all of this process' requests;
+# NCBI asks for no more than one request every two seconds
+HOST_MIN_REQUEST_INTERVAL_SECS = {
+    'blast.ncbi.nlm.nih.gov': 2,
+}
+
+
 # -----------------------------------
 # --- Caching
 # -----------------------------------
@@ -60,3 +193,32 @@ USE_BLAST_CACHING = True
 
 # enables google image search result caching
 USE_GIS_CACHING = True
+
+# a BLAST request for a sequence that isn't cached is answered right away with the cached results of one that differs
+# from it in at most this many bases (e.g. a misread brick), labelled as approximate; 0 disables this
+NEAR_MATCH_MAX_MISMATCHES = 2
+
+# whether to go on and search for the exact sequence after showing a near match's results
+NEAR_MATCH_SEARCH_EXACT = True
+
+# how many of the most recently cached sequences are looked through for near matches
+NEAR_MATCH_INDEX_SIZE = 10000
+
+# size of the in-memory tier in front of the cache directory, in bytes of pickled values
+CACHE_MEMORY_BYTES = 64 * 1024 * 1024
+# the longest an entry is kept in the in-memory tier, in seconds, so other processes' writes are seen after at most this
+CACHE_MEMORY_TTL_SECS = 5 * 60
+# namespaces that several processes read, modify and write back; they skip the in-memory tier, so each read sees the
+# latest write
+CACHE_SHARED_PREFIXES = ('BLAST_TIMES:', 'BLAST_SEQS:')
+# the cache directory is trimmed back below this size, oldest entries first
+CACHE_DISK_BYTES = 1024 * 1024 * 1024
+# how often the cache directory is checked for its size and expired entries
+CACHE_EVICTION_INTERVAL_SECS = 10 * 60
+# how long entries live by key prefix, in seconds; other keys use CACHE_DEFAULT_TIMEOUT
+CACHE_TTLS = {
+    'BLAST:': 30 * 24 * 60 * 60,
+    'SPECIES_IMG:': 90 * 24 * 60 * 60,
+    'BLAST_TIMES:': 30 * 24 * 60 * 60,
+    'BLAST_SEQS:': 30 * 24 * 60 * 60,
+}
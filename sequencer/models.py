@@ -23,6 +23,13 @@ class Sequence(db.Model):
     sequence = db.Column(db.Text, nullable=False)
     results = db.Column(db.Text)
 
+    # the NCBI search for this sequence's bases, so a client that reconnects can resume it (see blaster.blast_steps())
+    blast_query = db.Column(db.Text)  # the bases searched for
+    blast_rid = db.Column(db.Text)  # NCBI's request id, valid for BLAST_RID_LIFETIME_SECS
+    blast_query_index = db.Column(db.Integer)  # position of the query in that (batched) request
+    blast_submitted = db.Column(db.TIMESTAMP)
+    blast_status = db.Column(db.Text)  # waiting, then one of ready, no_hits, timeout, failed
+
     def __init__(self, username=None, sequence=None):
         self.username = username
         self.sequence = sequence
@@ -1,23 +1,80 @@
 from Bio import Align
-from Bio.Seq import Seq
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+from threading import Lock
+from types import MappingProxyType
+import itertools
 import json
 import math
+import multiprocessing
+import numpy
 import os
 
+import logging
+logger = logging.getLogger(__name__)
+
 # Load the examples JSON
 EXAMPLES_PATH = os.path.join(os.path.dirname(__file__), "sequence_examples.json")
 
 with open(EXAMPLES_PATH) as f:
     EXAMPLES = json.load(f)
 
+# spaced seeds used to pick candidate examples before aligning: each pattern's '1's are the
+# bases that have to match exactly, its '0's may differ. Wherever a read of 22 bases has 3
+# substitutions, or one of 28 bases has 4, at least one of these patterns still fits between
+# them, so such reads are found from a single seed; contiguous k-mers only manage that when
+# they're so short that every read seeds all over the examples
+SEED_PATTERNS = (
+    "1111011101111",
+    "111010010100101111",
+    "11111010011001011",
+    "1100010001101110111",
+    "11101101101010011",
+    "11100101110001111",
+    "1001101001110010111",
+)
+# seeds whose diagonals (ref pos - read pos) differ by at most this much are chained together,
+# which tolerates small indels between seeds
+SEED_BAND = 16
+# minimum number of read bases covered by chained seeds for an example to be aligned at all;
+# any one seed covers 11, and a given one occurs by chance about once in 4 Mb of reference
+SEED_MIN_COVERAGE = 11
+# maximum number of candidate examples that go through the full alignment
+SEED_MAX_CANDIDATES = 3
+
+# if true, candidates are aligned only against a window of the reference around their seed
+# chain instead of the whole reference, so the cost depends on the read length alone
+BANDED_ALIGNMENT = True
+
+# number of distinct reads whose query_sequence() results are kept in memory (LRU)
+QUERY_CACHE_SIZE = 1024
+
+# where precomputed reads match, as find_match() returns it, by normalized read; filled from
+# disk or built in the background by support.example_table, and consulted before matching
+EXAMPLE_TABLE = {}
+
+# minimum identity for query_sequence() to match a read to an example
+QUERY_PERCENT_IDENTITY = 0.5
+
+# number of worker processes used by query_sequences(), None for one per CPU
+QUERY_POOL_WORKERS = None
+# reads are sent to the workers in chunks of at least this many, since a single short read
+# aligns faster than it takes to pickle it over to a worker and back; batches smaller than
+# two chunks are processed in this process instead
+QUERY_POOL_MIN_CHUNK = 32
+
 
 def make_blast_mock_single_hit(
-    alignment,gene='Gene'
+    alignment,gene='Gene', strand="Plus"
 ) -> dict:
     """
     Build a minimal BLAST JSON-like dict with a single hit, keeping only fields you care about.
     - Uses gapped qseq/hseq and a BLAST-style midline.
     - Computes identity, align_len, gaps (count of '-' chars across both strings).
+    - 'strand' is the strand of the read that matched the example ("Minus" if its reverse
+      complement did).
     """
     # Basic sanity checks
     qseq, midline, hseq, start_gaps, end_gaps = format_alignment(alignment, gene)
@@ -38,7 +95,7 @@ def make_blast_mock_single_hit(
                                     "hsps": [
                                         {
                                             "score": score,
-                                            "query_strand": "Plus",
+                                            "query_strand": strand,
                                             "hit_strand": "Plus",
                                             "align_len": align_len,
                                             "aln_start" : start_gaps +1,
@@ -75,8 +132,162 @@ def _normalize_nt(s: str) -> str:
     return "".join(s.split()).upper().replace("U", "T")
 
 
+_COMPLEMENT = str.maketrans("ACGTN", "TGCAN")
+
+
+def reverse_complement(seq: str) -> str:
+    return seq.translate(_COMPLEMENT)[::-1]
+
+
+# offsets of the bases each seed pattern looks at
+SEED_OFFSETS = tuple(tuple(i for i, c in enumerate(pattern) if c == "1") for pattern in SEED_PATTERNS)
+
+
+def _seeds(seq, offsets):
+    """
+    Yields (position, seed) for every placement of the pattern with the given offsets in seq.
+    """
+    span = offsets[-1] + 1
+    for pos in range(len(seq) - span + 1):
+        yield pos, "".join([seq[pos + offset] for offset in offsets])
+
+
+def _build_seed_index(references):
+    """
+    Index every seed of every reference:
+    (pattern number, seed) -> tuple of (example name, ref position).
+    """
+    index = defaultdict(list)
+    for name, ref in references.items():
+        for pattern, offsets in enumerate(SEED_OFFSETS):
+            for pos, seed in _seeds(ref, offsets):
+                index[pattern, seed].append((name, pos))
+    return {key: tuple(hits) for key, hits in index.items()}
+
+
+# normalized reference sequences and their seed index, built once at import
+REFERENCES = {name: _normalize_nt(data["sequence"]) for name, data in EXAMPLES.items()}
+SEED_INDEX = _build_seed_index(REFERENCES)
+
+
+def _best_seed_chain(hits, read_len, band=SEED_BAND):
+    """
+    Slide a window of width 'band' over the diagonal-sorted seed hits (diagonal, read position,
+    pattern number) of one example and return (covered read bases, lowest diagonal, highest
+    diagonal) for the best window.
+    """
+    hits.sort()
+    depth = [0] * read_len  # number of seeds in the window covering each read position
+    covered, lo = 0, 0
+    best = (0, None, None)
+    for diag, read_pos, pattern in hits:
+        for offset in SEED_OFFSETS[pattern]:
+            if depth[read_pos + offset] == 0:
+                covered += 1
+            depth[read_pos + offset] += 1
+        while diag - hits[lo][0] > band:
+            _, lo_pos, lo_pattern = hits[lo]
+            for offset in SEED_OFFSETS[lo_pattern]:
+                depth[lo_pos + offset] -= 1
+                if depth[lo_pos + offset] == 0:
+                    covered -= 1
+            lo += 1
+        if covered > best[0]:
+            best = (covered, hits[lo][0], diag)
+    return best
+
+
+def find_seed_candidates(seq: str, min_coverage=SEED_MIN_COVERAGE, max_candidates=SEED_MAX_CANDIDATES):
+    """
+    Look up the seeds of 'seq' and of its reverse complement in the seed index.
+    Returns a dict of at most 'max_candidates' (example name, strand) pairs (in EXAMPLES order,
+    "Plus" before "Minus") mapped to (covered read bases, lowest diagonal, highest diagonal) of
+    their best seed chain; the diagonal is the ref position minus the position in the read (or
+    in its reverse complement), i.e. the offset the read maps to.
+    An empty dict means the read can't match any example.
+    """
+    seq = _normalize_nt(seq)
+    reads = (("Plus", seq), ("Minus", reverse_complement(seq)))
+    hits = defaultdict(list)
+    for strand, read in reads:
+        for pattern, offsets in enumerate(SEED_OFFSETS):
+            for read_pos, seed in _seeds(read, offsets):
+                for name, ref_pos in SEED_INDEX.get((pattern, seed), ()):
+                    hits[name, strand].append((ref_pos - read_pos, read_pos, pattern))
+
+    chains = {}
+    for name in REFERENCES:
+        for strand, _ in reads:
+            if (name, strand) in hits:
+                chain = _best_seed_chain(hits[name, strand], len(seq))
+                if chain[0] >= min_coverage:
+                    chains[name, strand] = chain
+    best = sorted(chains, key=lambda key: chains[key][0], reverse=True)[:max_candidates]
+    return {key: chain for key, chain in chains.items() if key in best}
+
+
+# standard genetic code, with codons ordered by their bases in "TCAG" order
+CODON_BASES = "TCAG"
+CODON_TABLE = "FFLLSSSSYY**CC*WLLLLPPPPHHQQRRRRIIIMTTTTNNKKSSRRVVVVAAAADDEEGGGG"
+
+# IUPAC nucleotide codes, by the bases each one stands for
+AMBIGUOUS_BASES = {
+    "T": "T", "C": "C", "A": "A", "G": "G", "U": "T",
+    "R": "AG", "Y": "CT", "S": "CG", "W": "AT", "K": "GT", "M": "AC",
+    "B": "CGT", "D": "AGT", "H": "ACT", "V": "ACG", "N": "ACGT",
+}
+# amino acid codes for ambiguous codons that stand for one of two amino acids
+AMBIGUOUS_AAS = {"DN": "B", "EQ": "Z", "IL": "J"}
+
+# 4-bit mask of the bases each code stands for (a bit per base in "TCAG" order) by its ASCII
+# value, 0 for anything else
+_NT_CODES = numpy.zeros(256, dtype=numpy.uint8)
+for _code, _bases in AMBIGUOUS_BASES.items():
+    _NT_CODES[ord(_code)] = _NT_CODES[ord(_code.lower())] = sum(1 << CODON_BASES.index(b) for b in _bases)
+
+
+def _ambiguous_aa(masks):
+    """
+    Returns the amino acid coded for by all of the codons in the base 'masks', or 'X'.
+    """
+    aas = {
+        CODON_TABLE[16 * first + 4 * second + third]
+        for first, second, third in itertools.product(
+            *([i for i in range(4) if mask >> i & 1] for mask in masks)
+        )
+    }
+    if len(aas) == 1:
+        return aas.pop()
+    return AMBIGUOUS_AAS.get("".join(sorted(aas)), "X")
+
+
+# amino acid by codon index (256 * 1st + 16 * 2nd + 3rd base mask); like Biopython, ambiguous
+# codons get the amino acid (or stop) that all the codons they stand for have in common, or B, Z
+# or J for the usual pairs, and X otherwise. Unlike Biopython, other characters (X included) give
+# X rather than an error.
+_AA_CODES = numpy.frombuffer(
+    "".join(_ambiguous_aa(masks) for masks in itertools.product(range(16), repeat=3)).encode("ascii"),
+    dtype=numpy.uint8
+)
+
+
+def translate_batch(seqs):
+    """
+    Translate many nucleotide sequences in one pass; a trailing partial codon is ignored.
+    Returns the list of amino acid sequences, with stop codons as '*'.
+    """
+    n_codons = [len(seq) // 3 for seq in seqs]
+    nts = _as_array("".join(seq[:n * 3] for seq, n in zip(seqs, n_codons)))
+    codes = _NT_CODES[nts].reshape(-1, 3).astype(numpy.intp)
+    codons = codes[:, 0] * 256 + codes[:, 1] * 16 + codes[:, 2]
+    aas = _AA_CODES[codons].tobytes().decode("ascii")
+
+    bounds = numpy.cumsum([0] + n_codons).tolist()
+    return [aas[start:end] for start, end in zip(bounds, bounds[1:])]
+
+
 def get_aa(seq):
-    return str(Seq(seq).translate())
+    return translate_batch([seq])[0]
 
 
 def minmax(x):
@@ -85,18 +296,7 @@ def minmax(x):
     return min(x), max(x)
 
 
-def find_best_match(seq: str, percent_identity=0.7):
-    """
-    Align 'seq' to known examples (local alignment).
-    Returns:
-      - best example name (or 'general')
-      - list of nt variants (within core alignment only)
-      - AA sequence from aligned query (trimmed to full codons)
-      - AA sequence from query (aligned part)
-      - AA offset in query
-    """
-    seq = _normalize_nt(seq)
-    min_score = len(seq) * percent_identity  # minimum score for a decent alignment
+def _make_aligner():
     aligner = Align.PairwiseAligner()
     aligner.mode = "global"
     aligner.match_score = 1
@@ -104,19 +304,102 @@ def find_best_match(seq: str, percent_identity=0.7):
     aligner.open_gap_score = -3
     aligner.extend_gap_score = -.5
     aligner.target_end_gap_score = 0        # no penalty at ref ends
+    return aligner
 
 
+# the aligner only holds scoring parameters, so a single instance is shared by all requests
+aligner = _make_aligner()
+
+
+def _band_window(read_len, ref_len, diag_lo, diag_hi):
+    """
+    Returns the (start, end) of the part of a reference around the diagonals [diag_lo, diag_hi]
+    of a seed chain.
+    """
+    margin = max(read_len, SEED_BAND)  # leaves room for indels around the seeds
+    return max(0, diag_lo - margin), min(ref_len, diag_hi + read_len + margin)
+
+
+def _align_banded(seq, ref, start, end):
+    """
+    Align 'seq' to ref[start:end], the window around its seed chain.
+    The returned alignment covers the whole of 'ref', like one from aligner.align(seq, ref).
+    """
+    window_aln = aligner.align(seq, ref[start:end])[0]
+
+    # shift the window's coordinates onto the full reference, then stretch the (free) gaps
+    # at either end of the query out to the ends of the reference
+    coordinates = window_aln.coordinates.copy()
+    coordinates[1] += start
+    if coordinates[0, 0] == coordinates[0, 1]:
+        coordinates[1, 0] = 0
+    elif start > 0:
+        coordinates = numpy.insert(coordinates, 0, (0, 0), axis=1)
+    if coordinates[0, -1] == coordinates[0, -2]:
+        coordinates[1, -1] = len(ref)
+    elif end < len(ref):
+        coordinates = numpy.append(coordinates, [[len(seq)], [len(ref)]], axis=1)
+
+    alignment = Align.Alignment([seq, ref], coordinates)
+    alignment.score = window_aln.score
+    return alignment
+
+
+def find_best_match(seq: str, percent_identity=0.7, banded=BANDED_ALIGNMENT):
+    """
+    Align 'seq' to known examples (local alignment), after picking candidates (on either
+    strand) from the seed index; reads without any are "general" without being aligned.
+    Returns:
+      - best example name (or 'general')
+      - the alignment of the read, or of its reverse complement, to that example (or None)
+      - the strand of the read that matched ("Plus" or "Minus")
+    """
+    seq = _normalize_nt(seq)
+    return align_match(seq, find_match(seq, percent_identity, banded))
+
+
+def align_match(seq, match):
+    """
+    Align the normalized read 'seq' where find_match() found it matches; returns what
+    find_best_match() does.
+    """
+    if match is None:
+        return "general", None, "Plus"
+    name, strand, start, end = match
+    read = seq if strand == "Plus" else reverse_complement(seq)
+    return name, _align_banded(read, REFERENCES[name], start, end), strand
 
-    best_name, best_alignment = "general", None
-    for name, data in EXAMPLES.items():
-        ref = _normalize_nt(data["sequence"])
-        alns = aligner.align(seq, ref)
-        if alns[0].score < min_score:
-            continue
-        if alns and (best_alignment is None or alns[0].score > best_alignment.score):
-            best_name, best_alignment = name, alns[0]
 
-    return best_name, best_alignment
+def find_match(seq, percent_identity=0.7, banded=BANDED_ALIGNMENT):
+    """
+    Score the normalized read 'seq' against its seed candidates like find_best_match() does,
+    without building the alignment.
+    Returns (example name, strand, start, end) of the best one, where start and end are the
+    part of the reference to align the read (or its reverse complement) to, or None if no
+    candidate scores well enough.
+    """
+    min_score = len(seq) * percent_identity  # minimum score for a decent alignment
+    reads = {"Plus": seq, "Minus": reverse_complement(seq)}
+
+    # only align against examples that share enough seeds with the read, on the strand they do
+    candidates = find_seed_candidates(seq)
+    if not candidates:
+        return None
+
+    # score every candidate first, then only build the alignment for the best one
+    keys = list(candidates)
+    if banded:
+        windows = [_band_window(len(seq), len(REFERENCES[name]), diag_lo, diag_hi)
+                   for (name, _), (_, diag_lo, diag_hi) in candidates.items()]
+    else:
+        windows = [(0, len(REFERENCES[name])) for name, _ in keys]
+    scores = [aligner.score(reads[strand], REFERENCES[name][start:end])
+              for (name, strand), (start, end) in zip(keys, windows)]
+
+    best = int(numpy.argmax(scores))  # the first candidate wins ties
+    if scores[best] < min_score:
+        return None
+    return keys[best] + windows[best]
 
 
 def resolve_variant(var, aln_ref, aln_query):
@@ -130,28 +413,46 @@ def resolve_variant(var, aln_ref, aln_query):
         vartype= var[0][3]
     else:
         vartype = 'delins'
-        r= "".join(aln_ref[i] for i in range(idx[0], idx[1]+1) if aln_ref[i] != "-")
-        a= "".join(aln_query[i] for i in range(idx[0], idx[1]+1) if aln_query[i] != "-")
+        r= aln_ref[idx[0]:idx[1]+1].replace("-", "")
+        a= aln_query[idx[0]:idx[1]+1].replace("-", "")
         alt = f"{r}>{a}" 
     #print(f"Resolving variant: {var} to {rna_pos}, {idx}, {codons}, {vartype}, {alt}")
     return (rna_pos, idx, codons,vartype, alt )
 
-def get_idx(idx,n, aln_ref, aln_query):
-    # go n nt in aln_query and return the index in aln_query
-    
-    step = 1 if n<0 else -1
-    i=n
-    pos=idx
-    while i != 0:
-        if aln_ref[pos] != "-":
-            i += step
-        pos +=- step
-        if pos < 0:
-            return get_idx(idx, n+3, aln_ref, aln_query)
-        if pos >= len(aln_ref):
-            return get_idx(idx, n-3, aln_ref, aln_query)
-    print(f'{n} steps from {idx} -> {pos}')
-    return pos
+
+GAP = ord("-")
+
+
+def _as_array(aln_row):
+    return numpy.frombuffer(aln_row.encode("ascii"), dtype=numpy.uint8)
+
+
+def get_idx(idx, n, ref_positions, aln_len):
+    """
+    Go n reference nt from alignment index 'idx' (right if n > 0, left if n < 0) and return the
+    alignment index reached. 'ref_positions' are the alignment indices of the non-gap reference
+    columns, in order. If that runs off either end of the alignment, retries one codon shorter.
+    """
+    tried = set()
+    while n != 0:
+        if n in tried:
+            # stepping in by a codon from one end runs off the other, i.e. the alignment is too
+            # short to hold the codon at all; stop at the nearest end
+            return 0 if n < 0 else aln_len
+        tried.add(n)
+        if n > 0:
+            # the n-th ref nt at or after idx, then one past it
+            k = numpy.searchsorted(ref_positions, idx, side="left") + n - 1
+            if k < len(ref_positions) and ref_positions[k] + 1 < aln_len:
+                return int(ref_positions[k]) + 1
+            n -= 3
+        else:
+            # the -n-th ref nt at or before idx, then one before it
+            k = numpy.searchsorted(ref_positions, idx, side="right") + n
+            if k >= 0 and ref_positions[k] >= 1:
+                return int(ref_positions[k]) - 1
+            n += 3
+    return idx
 
 
 def get_protein_variants(variants, aln_ref, aln_query, cds_start):
@@ -162,6 +463,9 @@ def get_protein_variants(variants, aln_ref, aln_query, cds_start):
     protein_variants = []
     pre=[]
     codons_set= set()  # set of codons that have variants
+    ref_positions = numpy.flatnonzero(_as_array(aln_ref) != GAP)
+    # collect the in-frame ref and read fragments around each variant, then translate them all at once
+    fragments = []
     for i in range(len(variants)):
         codons= variants[i][2]
         if i+1 < len(variants) and codons[1] >= variants[i+1][2][0]:
@@ -174,18 +478,19 @@ def get_protein_variants(variants, aln_ref, aln_query, cds_start):
         #print(f"{inframe_start} - {var[0][0]}, {var[0][1]} - {inframe_end}")
         start_n = inframe_start - var[0][0]
         end_n = inframe_end - var[0][1] 
-        start_idx = get_idx(var[1][0],start_n, aln_ref, aln_query)
-        end_idx = get_idx(var[1][1],end_n, aln_ref, aln_query)
+        start_idx = get_idx(var[1][0], start_n, ref_positions, len(aln_ref))
+        end_idx = get_idx(var[1][1], end_n, ref_positions, len(aln_ref))
         #print(f"start_idx={start_idx}, end_idx={end_idx}")
-        r= "".join(aln_ref[i] for i in range(start_idx, end_idx) if aln_ref[i] != "-")
-        q= "".join(aln_query[i] for i in range(start_idx, end_idx) if aln_query[i] != "-")
-        
-        aa_r= get_aa(r)
+        r= aln_ref[start_idx:end_idx].replace("-", "")
+        q= aln_query[start_idx:end_idx].replace("-", "")
+        fragments.append((var, r, q))
+
+    aas = translate_batch([r for _, r, _ in fragments] + [q for _, _, q in fragments])
+    for (var, r, q), aa_r, aa_q in zip(fragments, aas, aas[len(fragments):]):
         if len(q) % 3 != 0:
             protein_variants.append(f"p.{aa_r}{var[2][0]+1}fs")  # premature stop codon
             codons_set.add(var[2][0]+1)
             continue
-        aa_q= get_aa(q)
         if aa_r == aa_q:
             #protein_variants.append('synonymous')
             continue
@@ -218,33 +523,31 @@ def get_variants(alignment, name):
 
     aln_ref, aln_query, start_gaps, end_gaps = _format_alignment(alignment)
     # Variant calling within the core region only
-    ref_idx=start_gaps
-    variants = []  # list of variant tuples: (start, end, type, seq)
-    current_var=[]
-    for i, (q_nt, r_nt) in enumerate(zip(aln_query, aln_ref)):
-        if r_nt != "-":
-            ref_idx += 1
-        if q_nt == r_nt:
-            if current_var:
-                variants.append(resolve_variant(current_var, aln_ref, aln_query))
-                current_var = []
-            continue
-        codon= (ref_idx - cds_start) // 3
-        if q_nt != "-" and r_nt != "-":
-            current_var.append(
-                ((ref_idx, ref_idx), (i, i),(codon,codon), "sub", f"{r_nt}>{q_nt}")
-            )  # substitution
-        elif q_nt == "-":
-            current_var.append(
-                ((ref_idx, ref_idx), (i, i), (codon, codon), "del", r_nt)
-            )  # deletion vs ref
-        elif r_nt == "-":
-            current_var.append(
-                ((ref_idx, ref_idx), (i, i), (codon, codon), "ins", q_nt)
-            )  # insertion vs ref
-    if current_var:
-        variants.append(resolve_variant(current_var))
-    print('\n'.join(f"Variant: {v}" for v in variants))
+    ref = _as_array(aln_ref)
+    query = _as_array(aln_query)
+    # 1-based ref position of each column (of the preceding ref nt for insertions)
+    ref_idx = start_gaps + numpy.cumsum(ref != GAP)
+    codon = (ref_idx - cds_start) // 3
+
+    # each run of consecutive mismatching columns is one variant
+    mismatch = numpy.concatenate(([False], query != ref, [False]))
+    edges = numpy.flatnonzero(mismatch[1:] != mismatch[:-1])
+    variants = []  # list of variant tuples: ((start, end), (idx, idx), (codon, codon), type, seq)
+    for start, end in zip(edges[0::2].tolist(), (edges[1::2] - 1).tolist()):
+        rna_pos = (int(ref_idx[start]), int(ref_idx[end]))
+        codons = (int(codon[start]), int(codon[end]))
+        r, q = aln_ref[start:end + 1], aln_query[start:end + 1]
+        if "-" not in r and "-" not in q:
+            vartype, alt = "sub", f"{r}>{q}"
+            if start != end:
+                vartype = "delins"
+        elif q == "-" * len(q):
+            vartype, alt = "del", r  # deletion vs ref
+        elif r == "-" * len(r):
+            vartype, alt = "ins", q  # insertion vs ref
+        else:
+            vartype, alt = "delins", f'{r.replace("-", "")}>{q.replace("-", "")}'
+        variants.append((rna_pos, (start, end), codons, vartype, alt))
 
     return variants, get_protein_variants(variants, aln_ref, aln_query, cds_start=cds_start)
 
@@ -298,8 +601,121 @@ def format_alignment(aln,  seq=''):
     return (f'{offset_ref}: {ref}', match_line, f'{offset_query}: {query}', start_gaps, end_gaps)
 
 
+def _freeze(obj):
+    """
+    Recursively convert dicts and lists into read-only mappings and tuples.
+    """
+    if isinstance(obj, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in obj.items()})
+    if isinstance(obj, (list, tuple)):
+        return tuple(_freeze(v) for v in obj)
+    return obj
+
+
+def unfreeze(obj):
+    """
+    Return a mutable (and JSON-serializable) deep copy of a value returned by query_sequence().
+    """
+    if isinstance(obj, (dict, MappingProxyType)):
+        return {k: unfreeze(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [unfreeze(v) for v in obj]
+    return obj
+
+
 def query_sequence(seq):
-    name, aln = find_best_match(seq, percent_identity=0.5)
+    """
+    Match 'seq' against the examples.
+    Returns (example, gene, nt variants, protein variants, domains hit, mock BLAST json).
+
+    Results are cached per normalized read and shared between callers, so they're returned
+    read-only; use unfreeze() to get a copy that can be modified.
+    """
+    return _query_sequence_cached(_normalize_nt(seq))
+
+
+def query_cache_info():
+    """
+    Returns the hit/miss counters and size of the query_sequence() cache.
+    """
+    info = _query_sequence_cached.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize}
+
+
+@lru_cache(maxsize=QUERY_CACHE_SIZE)
+def _query_sequence_cached(seq):
+    return _freeze(_query_sequence(seq))
+
+
+_query_pool = None
+_query_pool_lock = Lock()
+
+
+def _get_query_pool():
+    """
+    Returns the process pool used by query_sequences(), starting it on first use.
+    """
+    global _query_pool
+    with _query_pool_lock:
+        if _query_pool is None:
+            # spawn rather than fork, since the web server's request threads may hold locks
+            _query_pool = ProcessPoolExecutor(
+                max_workers=QUERY_POOL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _query_pool
+
+
+def _discard_query_pool(pool):
+    """
+    Drops 'pool' after it broke, so the next query_sequences() starts a new one.
+    """
+    global _query_pool
+    with _query_pool_lock:
+        if _query_pool is pool:
+            _query_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _query_sequence_plain(seq):
+    # runs in the pool's workers; read-only results can't be pickled back
+    return unfreeze(query_sequence(seq))
+
+
+def query_sequences(reads):
+    """
+    Like query_sequence(), but for many reads at once, spread over a pool of worker processes.
+    Returns the results in the order of 'reads'.
+    """
+    reads = [_normalize_nt(seq) for seq in reads]
+    unique = list(dict.fromkeys(reads))  # duplicates are only aligned once
+
+    if len(unique) < 2 * QUERY_POOL_MIN_CHUNK:
+        results = dict(zip(unique, map(query_sequence, unique)))
+        return [results[seq] for seq in reads]
+
+    workers = QUERY_POOL_WORKERS or os.cpu_count() or 1
+    # a few chunks per worker keeps them all busy until the end without paying for many round trips
+    chunksize = max(QUERY_POOL_MIN_CHUNK, math.ceil(len(unique) / (workers * 4)))
+    pool = _get_query_pool()
+    try:
+        results = list(pool.map(_query_sequence_plain, unique, chunksize=chunksize))
+    except BrokenProcessPool:
+        # e.g. a worker died, or couldn't even start; the reads still get aligned here
+        logger.exception("Query pool broke, aligning %d reads in this process", len(unique))
+        _discard_query_pool(pool)
+        results = dict(zip(unique, map(query_sequence, unique)))
+    else:
+        results = dict(zip(unique, map(_freeze, results)))
+    return [results[seq] for seq in reads]
+
+
+def _query_sequence(seq):
+    # reads in the example table have their match looked up rather than found
+    if seq in EXAMPLE_TABLE:
+        name, aln, strand = align_match(seq, EXAMPLE_TABLE[seq])
+    else:
+        name, aln, strand = find_best_match(seq, percent_identity=QUERY_PERCENT_IDENTITY)
     if name != "general":
         domains = EXAMPLES[name].get("features", {})
         gene = EXAMPLES[name].get("gene", "unknown")
@@ -307,7 +723,8 @@ def query_sequence(seq):
         example = EXAMPLES[name]["example"]
         json_data = make_blast_mock_single_hit(
             alignment=aln,
-            gene=gene
+            gene=gene,
+            strand=strand
         )
         aln_infos = json_data["BlastOutput2"][0]["report"]["results"]["search"]["hits"][0]["hsps"][0]
         aln_start_codon= (aln_infos["aln_start"]- cds_start)//3
@@ -320,30 +737,32 @@ def query_sequence(seq):
 def overlap(interval1, interval2):
     return interval1[0] <= interval2[1] and interval2[0] <= interval1[1]
 
+# reads of the demo sequences, wildtype and with the variants they're meant to show
+EXAMPLE_READS = [
+    "GGTCAACGAGCAAGAATTTCTTTAGCAAGAGCA",
+    "GATCAATGAGCAAGAATTTCTTTAGCAAGAGCA",
+
+    "CTGGGCTCCGGTGCGTTCGGCACGGTG",
+    "CTGAGCTCCGGTGCGTTCGGCACGGTG",
+    "CCCGTCGCTATCAAGGAATTAAGAGAAGCAACATCTCCGAAAGCCAAC",
+    "CCCGTCGCTATCAAGACATCTCCGAAAGCCAAC",
+
+    "GCCGGTAGCACACCTTGTAATGGTGTTGAAGGT",
+    "GCCGGTGGCACACCTTGTAATGGTGTTGAAGGT",
+    "GCCGGTAACACACCTTGTAATGGTGTTGAAGGT",
+    "GCCGGTAGCACACCTTGTAATGGTGTTCAAGGT",
+
+    "CACGTGAAGGCGGCGCGCGCCCGGGACC",
+    "CACTTGAAGGCGGCGCGCGCCCGGGACC",
+
+    "GTCCAGAGATACATTGACCTTCTCCCCA",
+    "GTCCAGAGATACCTTGAGCTTCTCCCCA",
+]
+
+
 if __name__ == "__main__":
     # Example usage
-    seqL = [
-        "GGTCAACGAGCAAGAATTTCTTTAGCAAGAGCA",
-        "GATCAATGAGCAAGAATTTCTTTAGCAAGAGCA",
-    
-        "CTGGGCTCCGGTGCGTTCGGCACGGTG",
-        "CTGAGCTCCGGTGCGTTCGGCACGGTG",
-        "CCCGTCGCTATCAAGGAATTAAGAGAAGCAACATCTCCGAAAGCCAAC",
-        "CCCGTCGCTATCAAGACATCTCCGAAAGCCAAC",
-
-        "GCCGGTAGCACACCTTGTAATGGTGTTGAAGGT",
-        "GCCGGTGGCACACCTTGTAATGGTGTTGAAGGT",
-        "GCCGGTAACACACCTTGTAATGGTGTTGAAGGT",
-        "GCCGGTAGCACACCTTGTAATGGTGTTCAAGGT",
-
-        "CACGTGAAGGCGGCGCGCGCCCGGGACC",
-        "CACTTGAAGGCGGCGCGCGCCCGGGACC",
-
-        "GTCCAGAGATACATTGACCTTCTCCCCA",
-        "GTCCAGAGATACCTTGAGCTTCTCCCCA",
-        ]
-
-    for seq in seqL:
+    for seq in EXAMPLE_READS:
 
         # name, aln = find_best_match(seq, percent_identity=0.5)
         # gene= EXAMPLES.get(name, {}).get("gene", "unknown")
@@ -357,7 +776,7 @@ if __name__ == "__main__":
             print((f'matched_example={name}')),
             print(f'variants={", ".join(var)}')
             print(f'protein variants={", ".join(protein_var)}'),
-            print(f'domains={domains}')
+            print(f'domains={unfreeze(domains)}')
             print('aln=\n'+'\n'.join([aln['qseq'], aln['midline'], aln['hseq']])),
 
         #print(f'aa_seq_q={aa_seq_q}'),
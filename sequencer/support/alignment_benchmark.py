@@ -0,0 +1,185 @@
+"""
+Benchmarks the example matching engine in support.alignment, without the web app.
+
+Runs query_sequence()'s pipeline (bypassing its caches) over a fixed corpus of reads, reports the time spent in each
+stage, the throughput and the peak memory, and compares every result against a golden file so changes to the
+examples or the aligner that alter results don't go unnoticed.
+
+Usage:
+    python -m sequencer.support.alignment_benchmark [--repeat N] [--update-golden]
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import resource
+import tracemalloc
+from collections import defaultdict
+from time import perf_counter
+
+from sequencer.support import alignment
+from sequencer.support.ev3_reader import SAMPLE_SEQUENCES, NUM_BRICKS
+
+GOLDEN_PATH = os.path.join(os.path.dirname(__file__), "alignment_benchmark_golden.json")
+
+# the pipeline stages that are timed, in the order they run
+STAGES = ("find_best_match", "make_blast_mock_single_hit", "get_variants", "get_protein_variants")
+
+
+def make_corpus(reads_per_set=50, seed=0):
+    """
+    Returns a dict of corpus name -> list of reads:
+    - the demo reads from support.alignment,
+    - NUM_BRICKS windows of ev3_reader's sample sequences with 0 to 3 random substitutions,
+    - the reverse complements of such windows with 0 or 1 substitutions (bricks loaded backwards),
+    - random reads of NUM_BRICKS bases, which shouldn't match any example.
+    """
+    rng = random.Random(seed)
+    samples = [seq for name, seq in sorted(SAMPLE_SEQUENCES.items()) if name != "random"]
+
+    corpus = {"demo": list(alignment.EXAMPLE_READS)}
+    for n_var in range(4):
+        reads = []
+        for _ in range(reads_per_set):
+            seq = rng.choice(samples)
+            start = rng.randint(0, max(0, len(seq) - NUM_BRICKS))
+            read = list(seq[start:start + NUM_BRICKS])
+            for _ in range(n_var):
+                read[rng.randrange(len(read))] = rng.choice("ACGT")
+            reads.append("".join(read))
+        corpus["samples_%dvar" % n_var] = reads
+        if n_var <= 1:
+            corpus["reverse_%dvar" % n_var] = [alignment.reverse_complement(read) for read in reads]
+    corpus["random"] = ["".join(rng.choice("ACGT") for _ in range(NUM_BRICKS)) for _ in range(reads_per_set)]
+    return corpus
+
+
+class StageTimer:
+    """
+    Wraps the pipeline's functions in support.alignment to accumulate the time spent in each, excluding the time
+    spent in nested timed stages (get_variants calls get_protein_variants).
+    """
+
+    def __init__(self, stages=STAGES):
+        self.stages = stages
+        self.totals = defaultdict(float)
+        self._originals = {}
+        self._nested = []
+
+    def _wrap(self, stage, func):
+        def timed(*args, **kwargs):
+            self._nested.append(0.0)
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = perf_counter() - start
+                nested = self._nested.pop()
+                self.totals[stage] += elapsed - nested
+                if self._nested:
+                    self._nested[-1] += elapsed
+        return timed
+
+    def __enter__(self):
+        for stage in self.stages:
+            self._originals[stage] = getattr(alignment, stage)
+            setattr(alignment, stage, self._wrap(stage, self._originals[stage]))
+        return self
+
+    def __exit__(self, *exc_info):
+        for stage, func in self._originals.items():
+            setattr(alignment, stage, func)
+
+
+def _digest(result):
+    return hashlib.sha1(json.dumps(result, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _summary(result):
+    """
+    The human-readable part of a result kept in the golden file (the rest is only compared by digest).
+    """
+    example, gene, variants, protein_variants, domains, _ = result
+    return {
+        "example": example,
+        "gene": gene,
+        "variants": variants,
+        "protein_variants": protein_variants,
+        "domains": sorted(domains),
+        "digest": _digest(result),
+    }
+
+
+def run(corpus, repeat=1):
+    """
+    Runs every read of the corpus through the pipeline 'repeat' times.
+    :return: (summaries by read, stage timings, timings by corpus set, total seconds)
+    """
+    summaries = {}
+    per_set = {}
+    with StageTimer() as timer:
+        start = perf_counter()
+        for name, reads in corpus.items():
+            set_start = perf_counter()
+            for _ in range(repeat):
+                for read in reads:
+                    summaries[read] = _summary(alignment.unfreeze(alignment._query_sequence(read)))
+            per_set[name] = perf_counter() - set_start
+        total = perf_counter() - start
+    return summaries, dict(timer.totals), per_set, total
+
+
+def compare_golden(summaries, path=GOLDEN_PATH):
+    """
+    :return: a list of (read, expected, actual) for every read whose result differs from the golden file
+    """
+    with open(path) as fp:
+        golden = json.load(fp)
+    return [
+        (read, golden.get(read), summary)
+        for read, summary in summaries.items()
+        if golden.get(read) != summary
+    ]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--reads", type=int, default=50, help="reads per generated corpus set")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the generated reads")
+    parser.add_argument("--repeat", type=int, default=3, help="times each read is run through the pipeline")
+    parser.add_argument("--update-golden", action="store_true", help="overwrite the golden file with these results")
+    args = parser.parse_args(argv)
+
+    corpus = make_corpus(args.reads, args.seed)
+    n_reads = sum(len(reads) for reads in corpus.values()) * args.repeat
+
+    tracemalloc.start()
+    summaries, stages, per_set, total = run(corpus, repeat=args.repeat)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print("%d reads in %.3f s: %.1f reads/s" % (n_reads, total, n_reads / total))
+    for stage in STAGES:
+        print("  %-28s %8.3f s  %7.1f us/read" % (stage, stages.get(stage, 0.0), stages.get(stage, 0.0) * 1e6 / n_reads))
+    for name, reads in corpus.items():
+        count = len(reads) * args.repeat
+        print("  %-28s %8.3f s  %7.1f reads/s" % (name, per_set[name], count / per_set[name]))
+    print("peak traced memory: %.1f MiB, max RSS: %.1f MiB" % (
+        peak / 2 ** 20, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2 ** 10))
+
+    if args.update_golden:
+        with open(GOLDEN_PATH, "w") as fp:
+            json.dump(summaries, fp, indent=1, sort_keys=True)
+        print("wrote %d results to %s" % (len(summaries), GOLDEN_PATH))
+        return 0
+
+    mismatches = compare_golden(summaries)
+    for read, expected, actual in mismatches:
+        print("MISMATCH %s\n  expected: %s\n  actual:   %s" % (read, expected, actual))
+    print("golden check: %d of %d reads differ" % (len(mismatches), len(summaries)))
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
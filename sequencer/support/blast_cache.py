@@ -0,0 +1,265 @@
+"""
+Compact cache entries for BLAST results.
+
+Of a JSON2_S result, the frontend only shows each hit's species and its hsps' scores, strands and alignments, so
+only those fields are cached, stored column-wise (one list per field across all hits or hsps) and compressed with
+zlib. Entries are expanded back into the JSON2_S shape, minus the dropped fields, when they're read.
+
+The format's version is part of the cache key, so changing the format just leaves the old entries to expire.
+
+The sequences that have results cached are also listed (per database and program) under a BLAST_SEQS: key, which is
+one of CACHE_SHARED_PREFIXES so that every process adds to and reads the latest list. Each process indexes them from
+there for load_similar(): a sequence within NEAR_MATCH_MAX_MISMATCHES substitutions of another shares at least one of
+its NEAR_MATCH_MAX_MISMATCHES + 1 segments with it, at the same place, so the index maps each segment to the
+sequences that have it there and only those are compared base by base.
+"""
+import json
+import threading
+import zlib
+from collections import defaultdict
+from time import time
+
+from sequencer.cache import cache
+from sequencer.default_settings import NEAR_MATCH_MAX_MISMATCHES, NEAR_MATCH_INDEX_SIZE
+
+import logging
+logger = logging.getLogger(__name__)
+
+# bump whenever the fields or layout below change
+FORMAT_VERSION = 1
+
+# fields kept from each hit's first description, and from each hsp
+HIT_FIELDS = ('accession', 'title', 'taxid', 'sciname')
+HSP_FIELDS = ('score', 'evalue', 'identity', 'query_strand', 'hit_strand', 'align_len', 'qseq', 'midline', 'hseq')
+
+COMPRESSION_LEVEL = 6
+
+# how often each process re-reads the list of cached sequences, to see those cached by the others
+INDEX_REFRESH_SECS = 60
+
+
+def cache_key(sequence, database, program):
+    return "BLAST:v%d:%s_%s_%s" % (FORMAT_VERSION, sequence, database, program)
+
+
+def _split_key(key):
+    """
+    Returns the sequence of a cache_key() and the rest of it, which names the database and program.
+    """
+    sequence, search = key.split(":", 2)[2].split("_", 1)
+    return sequence, search
+
+
+class CompactEntry:
+    """
+    Collects the cached fields of a result's hits as they come in, e.g. while the result is still being parsed.
+    """
+
+    def __init__(self, query_len=None):
+        self.query_len = query_len
+        self.hits = {field: [] for field in HIT_FIELDS}
+        self.hit_len = []
+        self.num_hsps = []
+        self.hsps = {field: [] for field in HSP_FIELDS}
+
+    def add_hits(self, hits):
+        for hit in hits:
+            description = hit["description"][0]
+            for field in HIT_FIELDS:
+                self.hits[field].append(description.get(field))
+            self.hit_len.append(hit.get("len"))
+            self.num_hsps.append(len(hit["hsps"]))
+            for hsp in hit["hsps"]:
+                for field in HSP_FIELDS:
+                    self.hsps[field].append(hsp.get(field))
+
+    def pack(self):
+        """
+        Returns the entry as compressed bytes, see expand().
+        """
+        entry = {
+            "query_len": self.query_len,
+            "hits": self.hits,
+            "hit_len": self.hit_len,
+            "num_hsps": self.num_hsps,
+            "hsps": self.hsps,
+        }
+        data = json.dumps(entry, separators=(",", ":")).encode("utf-8")
+        return zlib.compress(data, COMPRESSION_LEVEL)
+
+
+def compact(result):
+    """
+    Packs a single-query JSON2_S result into compressed bytes, see expand().
+    """
+    search = result["BlastOutput2"][0]["report"]["results"]["search"]
+    entry = CompactEntry(search.get("query_len"))
+    entry.add_hits(search.get("hits", []))
+    return entry.pack()
+
+
+def expand(data):
+    """
+    Unpacks bytes made by compact() into a JSON2_S result with the kept fields.
+    """
+    entry = json.loads(zlib.decompress(data).decode("utf-8"))
+    # rows of field values, in the order of HIT_FIELDS and HSP_FIELDS
+    descriptions = zip(*(entry["hits"][field] for field in HIT_FIELDS))
+    hsp_rows = iter(zip(*(entry["hsps"][field] for field in HSP_FIELDS)))
+    hits = []
+    for num, (description, length, num_hsps) in enumerate(zip(descriptions, entry["hit_len"], entry["num_hsps"]), 1):
+        hsps = [dict(zip(HSP_FIELDS, next(hsp_rows)), num=i) for i in range(1, num_hsps + 1)]
+        hits.append({
+            "num": num,
+            "description": [dict(zip(HIT_FIELDS, description))],
+            "len": length,
+            "hsps": hsps,
+        })
+    return {
+        "BlastOutput2": [{
+            "report": {
+                "results": {
+                    "search": {
+                        "query_len": entry["query_len"],
+                        "hits": hits,
+                    }
+                }
+            }
+        }]
+    }
+
+
+def load(key):
+    """
+    Returns the result cached under key, or None if there's none (or it can't be read).
+    """
+    data = cache.get(key)
+    if data is None:
+        return None
+    try:
+        return expand(data)
+    except (zlib.error, ValueError, KeyError, TypeError) as ex:
+        logger.warning("Discarding unreadable cache entry %s: %s", key, ex)
+        cache.delete(key)
+        return None
+
+
+def store(key, result):
+    try:
+        data = compact(result)
+    except (KeyError, IndexError, TypeError) as ex:
+        logger.warning("Not caching result for %s, it isn't a single-query result: %s", key, ex)
+        return
+    cache.set(key, data)
+    _remember(key)
+
+
+def store_entry(key, entry):
+    """
+    Like store(), for a result whose CompactEntry was built as it was parsed.
+    """
+    cache.set(key, entry.pack())
+    _remember(key)
+
+
+# ------------------------------------------------------
+# --- near matches
+# ------------------------------------------------------
+
+class NeighborIndex:
+    """
+    Finds the sequences within 'max_mismatches' substitutions of a sequence of the same length, see the module
+    docstring.
+    """
+
+    def __init__(self, max_mismatches):
+        self.max_mismatches = max_mismatches
+        self.sequences = set()
+        self.segments = defaultdict(set)  # (length, segment number, segment) -> sequences
+
+    def _segments(self, sequence):
+        parts = self.max_mismatches + 1
+        bounds = [len(sequence) * i // parts for i in range(parts + 1)]
+        return [(len(sequence), i, sequence[bounds[i]:bounds[i + 1]]) for i in range(parts)]
+
+    def add(self, sequence):
+        if sequence not in self.sequences:
+            self.sequences.add(sequence)
+            for segment in self._segments(sequence):
+                self.segments[segment].add(sequence)
+
+    def discard(self, sequence):
+        if sequence in self.sequences:
+            self.sequences.discard(sequence)
+            for segment in self._segments(sequence):
+                self.segments[segment].discard(sequence)
+
+    def find(self, sequence):
+        """
+        Returns [(mismatches, other sequence), ...] for the other sequences near 'sequence', closest first.
+        """
+        candidates = set()
+        for segment in self._segments(sequence):
+            candidates.update(self.segments.get(segment, ()))
+        candidates.discard(sequence)
+        matches = []
+        for other in candidates:
+            mismatches = sum(a != b for a, b in zip(sequence, other))
+            if mismatches <= self.max_mismatches:
+                matches.append((mismatches, other))
+        return sorted(matches)
+
+
+_indices = {}  # "<database>_<program>", as in cache_key() -> (time loaded, NeighborIndex)
+_indices_lock = threading.Lock()  # guards the above and the indices themselves
+
+
+def _sequences_key(search):
+    return "BLAST_SEQS:v%d:%s" % (FORMAT_VERSION, search)
+
+
+def _index(search):
+    with _indices_lock:
+        loaded, index = _indices.get(search, (0, None))
+        if time() - loaded > INDEX_REFRESH_SECS:
+            index = NeighborIndex(NEAR_MATCH_MAX_MISMATCHES)
+            for sequence in cache.get(_sequences_key(search)) or []:
+                index.add(sequence)
+            _indices[search] = (time(), index)
+        return index
+
+
+def _remember(key):
+    """
+    Lists the sequence whose result was just cached under key, for load_similar().
+    """
+    if not NEAR_MATCH_MAX_MISMATCHES:
+        return
+    sequence, search = _split_key(key)
+    index = _index(search)
+    with _indices_lock:
+        index.add(sequence)
+    # other processes may add theirs at the same time and one of them lost, which only costs a near match
+    sequences = [other for other in cache.get(_sequences_key(search)) or [] if other != sequence]
+    cache.set(_sequences_key(search), (sequences + [sequence])[-NEAR_MATCH_INDEX_SIZE:])
+
+
+def load_similar(sequence, database, program):
+    """
+    Returns (cached sequence, mismatches, result) for the closest sequence to 'sequence' that has its result cached
+    and differs from it in at most NEAR_MATCH_MAX_MISMATCHES bases, or None if there's none.
+    """
+    # segments this short would match most of the index
+    if not NEAR_MATCH_MAX_MISMATCHES or len(sequence) < 4 * (NEAR_MATCH_MAX_MISMATCHES + 1):
+        return None
+    index = _index("%s_%s" % (database, program))
+    with _indices_lock:
+        matches = index.find(sequence)
+    for mismatches, other in matches:
+        result = load(cache_key(other, database, program))
+        if result is not None:
+            return other, mismatches, result
+        # its result has expired
+        with _indices_lock:
+            index.discard(other)
+    return None
@@ -0,0 +1,483 @@
+"""
+On-disk nucleotide database for support.local_blast, built from FASTA files with 'flask build-blast-db'.
+
+Everything is stored as flat arrays that are memory-mapped when the database is opened, so processes serving the
+same BLAST_DB_DIR share its pages through the OS page cache instead of each holding a copy:
+    sequences.2bit      the records' bases back to back, four to a byte (A=0, C=1, G=2, T=3, first base highest)
+    ambiguous.bin       (start, end) pairs of the runs of non-ACGT bases, which are packed as A and read back as N
+    offsets.bin         start of each record in the sequence, followed by the total length
+    names.txt           the FASTA headers, one per line
+    names.idx           start of each header in names.txt, followed by its size
+    taxids.bin          taxid of each record, 0 if the header doesn't name one
+    kmers.idx           for each k-mer (in 2-bit code order), the start of its positions in kmers.pos, then the total
+    kmers.pos           the start of every k-mer without ambiguous bases that lies within one record, grouped by
+                        k-mer and sorted within each group
+    meta.json           format version, k and sizes; written last, so a database without it is incomplete
+
+The build streams its input line by line and indexes the packed sequence in chunks, so its memory use depends on
+LOCAL_BLAST_BUILD_CHUNK and k, not on the size of the FASTA files.
+"""
+import gzip
+import json
+import mmap
+import os
+import re
+import threading
+
+import click
+import numpy
+from flask import current_app
+from flask.cli import with_appcontext
+
+from sequencer.default_settings import LOCAL_BLAST_WORD_SIZE, LOCAL_BLAST_BUILD_CHUNK
+
+import logging
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+FASTA_EXTENSIONS = ('.fa', '.fasta', '.fna', '.fa.gz', '.fasta.gz', '.fna.gz')
+
+FILES = ('sequences.2bit', 'ambiguous.bin', 'offsets.bin', 'names.txt', 'names.idx', 'taxids.bin',
+         'kmers.idx', 'kmers.pos')
+META_FILENAME = 'meta.json'
+
+BASES = 'ACGT'
+# maps bytes of sequence to 2-bit codes, with 4 for anything that isn't a base
+_ENCODE = bytes(
+    BASES.index(chr(c).upper()) if chr(c).upper() in BASES else (3 if chr(c).upper() == 'U' else 4)
+    for c in range(256)
+)
+_DECODE = numpy.frombuffer(BASES.encode('ascii'), dtype=numpy.uint8)
+
+
+# ------------------------------------------------------
+# --- FASTA input
+# ------------------------------------------------------
+
+def find_fasta_files(blast_db_dir):
+    if not blast_db_dir or not os.path.isdir(blast_db_dir):
+        return []
+    return sorted(
+        os.path.join(blast_db_dir, filename) for filename in os.listdir(blast_db_dir)
+        if filename.lower().endswith(FASTA_EXTENSIONS)
+    )
+
+
+def parse_header(header):
+    """
+    Splits a FASTA header into the fields of a JSON2_S hit description. Headers are expected to look like NCBI's, i.e.
+    '>accession title [Scientific name]', with an optional 'taxid=<n>' token; UniProt-style 'OS=' and 'OX=' fields are
+    understood, too.
+    """
+    seq_id, _, title = header.partition(' ')
+    accession = [part for part in seq_id.split('|') if part][-1].split('.')[0] if seq_id else ''
+
+    taxid_match = re.search(r'\b(?:taxid=|OX=)(\d+)', title)
+    taxid = int(taxid_match.group(1)) if taxid_match else 0
+    title = re.sub(r'\s*\btaxid=\d+', '', title).strip()
+
+    sciname_match = re.search(r'\[([^\]]+)\]\s*$', title) or re.search(r'\bOS=(.+?)(?:\s+[A-Z]{2}=|$)', title)
+    sciname = sciname_match.group(1).strip() if sciname_match else ' '.join(title.split()[:2])
+
+    return {'id': seq_id, 'accession': accession, 'title': title, 'taxid': taxid, 'sciname': sciname}
+
+
+def _read_fasta_lines(paths):
+    """
+    Yields (True, header) for each header and (False, line) for each line of sequence, as bytes.
+    """
+    for path in paths:
+        opener = gzip.open if path.endswith('.gz') else open
+        with opener(path, 'rb') as fp:
+            for line in fp:
+                line = line.strip()
+                if line.startswith(b'>'):
+                    yield True, line[1:]
+                elif line:
+                    yield False, line
+
+
+# ------------------------------------------------------
+# --- build
+# ------------------------------------------------------
+
+class _ArrayWriter:
+    """
+    Appends values of a fixed dtype to a file, a buffer at a time.
+    """
+
+    def __init__(self, path, dtype, buffer_size=1 << 16):
+        self.fp = open(path, 'wb')
+        self.dtype = dtype
+        self.buffer = []
+        self.buffer_size = buffer_size
+        self.count = 0
+
+    def append(self, value):
+        self.buffer.append(value)
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        numpy.asarray(self.buffer, dtype=self.dtype).tofile(self.fp)
+        self.count += len(self.buffer)
+        self.buffer = []
+
+    def close(self):
+        self.flush()
+        self.fp.close()
+
+
+class _SequenceWriter:
+    """
+    Packs 2-bit codes four to a byte and records where the non-ACGT runs are.
+    """
+
+    def __init__(self, path, ambiguous_path, buffer_size=1 << 20):
+        self.fp = open(path, 'wb')
+        self.ambiguous = _ArrayWriter(ambiguous_path, numpy.uint64)
+        self.buffer = []
+        self.buffered = 0
+        self.buffer_size = buffer_size
+        self.tail = numpy.zeros(0, dtype=numpy.uint8)  # codes left over from the last flush, fewer than four
+        self.length = 0
+        self.ambiguous_start = None
+
+    def write(self, line):
+        codes = numpy.frombuffer(line.translate(_ENCODE), dtype=numpy.uint8)
+        bad = codes == 4
+        if bad.any() or self.ambiguous_start is not None:
+            self._track_ambiguous(bad)
+            codes = numpy.where(bad, 0, codes).astype(numpy.uint8)
+        self.length += len(codes)
+        self.buffer.append(codes)
+        self.buffered += len(codes)
+        if self.buffered >= self.buffer_size:
+            self.flush()
+
+    def end_ambiguous_run(self):
+        if self.ambiguous_start is not None:
+            self.ambiguous.append(self.ambiguous_start)
+            self.ambiguous.append(self.length)
+            self.ambiguous_start = None
+
+    def _track_ambiguous(self, bad):
+        # runs are the stretches between changes of 'bad', carried over from the previous line
+        edges = numpy.flatnonzero(numpy.diff(bad.astype(numpy.int8), prepend=numpy.int8(
+            self.ambiguous_start is not None)))
+        for edge in edges:
+            if bad[edge]:
+                self.ambiguous_start = self.length + int(edge)
+            else:
+                self.ambiguous.append(self.ambiguous_start)
+                self.ambiguous.append(self.length + int(edge))
+                self.ambiguous_start = None
+
+    def flush(self, final=False):
+        codes = numpy.concatenate([self.tail] + self.buffer)
+        self.buffer, self.buffered = [], 0
+        usable = len(codes) if final else len(codes) - len(codes) % 4
+        codes, self.tail = codes[:usable], codes[usable:]
+        if len(codes) % 4:
+            codes = numpy.concatenate([codes, numpy.zeros(4 - len(codes) % 4, dtype=numpy.uint8)])
+        quads = codes.reshape(-1, 4)
+        packed = (quads[:, 0] << 6) | (quads[:, 1] << 4) | (quads[:, 2] << 2) | quads[:, 3]
+        packed.astype(numpy.uint8).tofile(self.fp)
+
+    def close(self):
+        self.end_ambiguous_run()
+        self.flush(final=True)
+        self.fp.close()
+        self.ambiguous.close()
+
+
+def _unpack(packed, start, end):
+    """
+    Returns the 2-bit codes of bases [start, end) of a packed sequence as a uint8 array.
+    """
+    chunk = numpy.asarray(packed[start // 4:(end + 3) // 4], dtype=numpy.uint8)
+    codes = numpy.empty((len(chunk), 4), dtype=numpy.uint8)
+    for i, shift in enumerate((6, 4, 2, 0)):
+        codes[:, i] = (chunk >> shift) & 3
+    return codes.ravel()[start % 4:start % 4 + end - start]
+
+
+def _kmer_codes(codes, k):
+    """
+    Returns the code of the k-mer starting at each position of 'codes' that has k bases after it.
+    """
+    n = len(codes) - k + 1
+    if n <= 0:
+        return numpy.zeros(0, dtype=numpy.uint64)
+    kmers = numpy.zeros(n, dtype=numpy.uint64)
+    for j in range(k):
+        kmers = (kmers << numpy.uint64(2)) | codes[j:j + n].astype(numpy.uint64)
+    return kmers
+
+
+def _chunk_kmers(packed, offsets, ambiguous, total, k, start, end):
+    """
+    Returns (positions, k-mer codes) of the indexable k-mers starting in [start, end): those that lie within one record
+    and contain no ambiguous bases.
+    """
+    stop = min(end + k - 1, total)
+    codes = _unpack(packed, start, stop)
+    kmers = _kmer_codes(codes, k)[:end - start]
+    positions = numpy.arange(start, start + len(kmers), dtype=numpy.uint64)
+
+    # k-mers must end before the end of the record they start in
+    record_ends = offsets[numpy.searchsorted(offsets, positions, side='right')]
+    valid = positions + numpy.uint64(k) <= record_ends
+
+    # ... and not overlap a run of ambiguous bases
+    if len(ambiguous):
+        first = numpy.searchsorted(ambiguous[:, 1], start, side='right')
+        last = numpy.searchsorted(ambiguous[:, 0], stop, side='left')
+        for run_start, run_end in ambiguous[first:last]:
+            lo = max(int(run_start) - k + 1, start) - start
+            hi = min(int(run_end), end) - start
+            if hi > lo:
+                valid[lo:hi] = False
+
+    return positions[valid], kmers[valid]
+
+
+def _build_kmer_index(path, packed, offsets, ambiguous, total, k, chunk_size):
+    """
+    Writes kmers.idx and kmers.pos, a counting sort of the k-mer positions in two passes over the packed sequence.
+    """
+    counts = numpy.zeros(4 ** k, dtype=numpy.uint64)
+    for start in range(0, total, chunk_size):
+        _, kmers = _chunk_kmers(packed, offsets, ambiguous, total, k, start, min(start + chunk_size, total))
+        counts += numpy.bincount(kmers.astype(numpy.int64), minlength=4 ** k).astype(numpy.uint64)
+
+    index = numpy.zeros(4 ** k + 1, dtype=numpy.uint64)
+    numpy.cumsum(counts, out=index[1:])
+    index.tofile(os.path.join(path, 'kmers.idx.tmp'))
+    num_positions = int(index[-1])
+    del counts
+
+    pos_dtype = numpy.uint32 if total < 2 ** 32 else numpy.uint64
+    pos_path = os.path.join(path, 'kmers.pos.tmp')
+    if num_positions == 0:
+        open(pos_path, 'wb').close()
+        return
+
+    positions_out = numpy.memmap(pos_path, dtype=pos_dtype, mode='w+', shape=(num_positions,))
+    cursor = index[:-1].copy()
+    for start in range(0, total, chunk_size):
+        positions, kmers = _chunk_kmers(packed, offsets, ambiguous, total, k, start, min(start + chunk_size, total))
+        order = numpy.argsort(kmers, kind='stable')
+        kmers, positions = kmers[order], positions[order]
+        unique, first, group_counts = numpy.unique(kmers, return_index=True, return_counts=True)
+        rank = numpy.arange(len(kmers), dtype=numpy.uint64) - numpy.repeat(first, group_counts).astype(numpy.uint64)
+        positions_out[cursor[kmers] + rank] = positions
+        cursor[unique] += group_counts.astype(numpy.uint64)
+    positions_out.flush()
+    del positions_out
+
+
+def build_database(fasta_paths, path, k=LOCAL_BLAST_WORD_SIZE, chunk_size=LOCAL_BLAST_BUILD_CHUNK, echo=None):
+    """
+    Converts the FASTA files 'fasta_paths' into a database in the directory 'path', replacing any database there.
+    :return: the database's meta data
+    """
+    echo = echo or logger.info
+    os.makedirs(path, exist_ok=True)
+    tmp = lambda filename: os.path.join(path, filename + '.tmp')
+
+    # pass 1: pack the sequences and write the record tables
+    sequences = _SequenceWriter(tmp('sequences.2bit'), tmp('ambiguous.bin'))
+    offsets = _ArrayWriter(tmp('offsets.bin'), numpy.uint64)
+    names_idx = _ArrayWriter(tmp('names.idx'), numpy.uint64)
+    taxids = _ArrayWriter(tmp('taxids.bin'), numpy.uint32)
+    with open(tmp('names.txt'), 'wb') as names:
+        for is_header, line in _read_fasta_lines(fasta_paths):
+            if is_header:
+                sequences.end_ambiguous_run()
+                offsets.append(sequences.length)
+                names_idx.append(names.tell())
+                header = line.decode('utf-8', errors='replace')
+                names.write(header.encode('utf-8') + b'\n')
+                taxids.append(parse_header(header)['taxid'])
+                num_records = offsets.count + len(offsets.buffer)
+                if num_records % 100000 == 0:
+                    echo('  %d records, %d bases' % (num_records, sequences.length))
+            elif offsets.count or offsets.buffer:
+                sequences.write(line)
+        offsets.append(sequences.length)
+        names_idx.append(names.tell())
+    num_records = offsets.count + len(offsets.buffer) - 1
+    total = sequences.length
+    for writer in (sequences, offsets, names_idx, taxids):
+        writer.close()
+    echo('Packed %d records, %d bases.' % (num_records, total))
+
+    # pass 2: index the k-mers of the packed sequences
+    record_offsets = numpy.fromfile(tmp('offsets.bin'), dtype=numpy.uint64)
+    ambiguous = numpy.fromfile(tmp('ambiguous.bin'), dtype=numpy.uint64).reshape(-1, 2)
+    packed = numpy.memmap(tmp('sequences.2bit'), dtype=numpy.uint8, mode='r') if total else numpy.zeros(0, numpy.uint8)
+    echo('Indexing %d-mers...' % k)
+    _build_kmer_index(path, packed, record_offsets, ambiguous, total, k, chunk_size)
+    del packed
+
+    for filename in FILES:
+        os.replace(tmp(filename), os.path.join(path, filename))
+    meta = {
+        'version': FORMAT_VERSION,
+        'k': k,
+        'num_records': num_records,
+        'total_length': total,
+        'position_dtype': 'uint32' if total < 2 ** 32 else 'uint64',
+    }
+    with open(tmp(META_FILENAME), 'w') as fp:
+        json.dump(meta, fp)
+    os.replace(tmp(META_FILENAME), os.path.join(path, META_FILENAME))
+    return meta
+
+
+# ------------------------------------------------------
+# --- reading
+# ------------------------------------------------------
+
+def _map(path, dtype):
+    """
+    Maps the file at 'path' read-only as an array of 'dtype'; empty files give an empty array.
+    """
+    if os.path.getsize(path) == 0:
+        return numpy.zeros(0, dtype=dtype)
+    with open(path, 'rb') as fp:
+        return numpy.frombuffer(mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ), dtype=dtype)
+
+
+class PackedDatabase:
+    """
+    A database written by build_database(), memory-mapped.
+    """
+
+    def __init__(self, path, meta):
+        self.path = path
+        self.name = os.path.basename(os.path.normpath(path))
+        self.k = meta['k']
+        self.total_length = meta['total_length']
+        file = lambda filename: os.path.join(path, filename)
+
+        self.packed = _map(file('sequences.2bit'), numpy.uint8)
+        self.ambiguous = _map(file('ambiguous.bin'), numpy.uint64).reshape(-1, 2)
+        self.offsets = _map(file('offsets.bin'), numpy.uint64)
+        self.names = _map(file('names.txt'), numpy.uint8)
+        self.names_idx = _map(file('names.idx'), numpy.uint64)
+        self.taxids = _map(file('taxids.bin'), numpy.uint32)
+        self.kmers_idx = _map(file('kmers.idx'), numpy.uint64)
+        self.kmers_pos = _map(file('kmers.pos'), numpy.dtype(meta['position_dtype']))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def bounds(self, record):
+        """
+        Returns the (start, end) of 'record' in the concatenated sequence.
+        """
+        return int(self.offsets[record]), int(self.offsets[record + 1])
+
+    def record_at(self, positions):
+        """
+        Returns the index of the record containing each of 'positions' (or of the single position given).
+        """
+        return numpy.searchsorted(self.offsets, positions, side='right') - 1
+
+    def description(self, record):
+        start, end = int(self.names_idx[record]), int(self.names_idx[record + 1])
+        description = parse_header(self.names[start:end].tobytes().decode('utf-8').rstrip('\n'))
+        description['taxid'] = int(self.taxids[record])
+        return description
+
+    def positions(self, kmer):
+        """
+        Returns the sorted start positions of the k-mer with code 'kmer'.
+        """
+        return self.kmers_pos[int(self.kmers_idx[kmer]):int(self.kmers_idx[kmer + 1])]
+
+    def fetch(self, start, end):
+        """
+        Returns bases [start, end) of the concatenated sequence as a string.
+        """
+        if end <= start:
+            return ''
+        chars = _DECODE[_unpack(self.packed, start, end)]
+        if len(self.ambiguous):
+            first = numpy.searchsorted(self.ambiguous[:, 1], start, side='right')
+            last = numpy.searchsorted(self.ambiguous[:, 0], end, side='left')
+            for run_start, run_end in self.ambiguous[first:last]:
+                chars[max(int(run_start), start) - start:min(int(run_end), end) - start] = ord('N')
+        return chars.tobytes().decode('ascii')
+
+
+def kmer_code(word):
+    """
+    Returns the 2-bit code of a k-mer of ACGT, or None if it contains anything else.
+    """
+    code = 0
+    for base in word:
+        i = BASES.find(base)
+        if i < 0:
+            return None
+        code = (code << 2) | i
+    return code
+
+
+def read_meta(path):
+    try:
+        with open(os.path.join(path, META_FILENAME)) as fp:
+            meta = json.load(fp)
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get('version') == FORMAT_VERSION else None
+
+
+_databases = {}
+_databases_lock = threading.Lock()
+
+
+def load_database(blast_db_dir):
+    """
+    Returns the PackedDatabase in 'blast_db_dir', or None if none has been built there. Databases are mapped once per
+    process and remapped when rebuilt.
+    """
+    if not blast_db_dir:
+        return None
+    try:
+        signature = os.stat(os.path.join(blast_db_dir, META_FILENAME)).st_mtime_ns
+    except OSError:
+        return None
+
+    with _databases_lock:
+        cached = _databases.get(blast_db_dir)
+        if cached is None or cached[0] != signature:
+            meta = read_meta(blast_db_dir)
+            if meta is None:
+                return None
+            logger.info("Mapping local BLAST database in %s", blast_db_dir)
+            cached = (signature, PackedDatabase(blast_db_dir, meta))
+            _databases[blast_db_dir] = cached
+        return cached[1]
+
+
+def init_app(app):
+    app.cli.add_command(build_blast_db_command)
+
+
+@click.command('build-blast-db')
+@click.argument('fasta_files', nargs=-1, type=click.Path(exists=True, dir_okay=False))
+@click.option('--kmer-size', '-k', default=LOCAL_BLAST_WORD_SIZE, show_default=True,
+              help='Length of the indexed words, i.e. the local search\'s word size.')
+@with_appcontext
+def build_blast_db_command(fasta_files, kmer_size):
+    """Index FASTA files (by default, those in BLAST_DB_DIR) for the local BLAST search."""
+    path = current_app.config['BLAST_DB_DIR']
+    fasta_files = fasta_files or find_fasta_files(path)
+    if not fasta_files:
+        raise click.UsageError('No FASTA files given or found in %s.' % path)
+    click.echo('Building the local BLAST database in %s from %d file(s)...' % (path, len(fasta_files)))
+    meta = build_database(fasta_files, path, k=kmer_size, echo=click.echo)
+    click.echo('Built the database: %d records, %d bases.' % (meta['num_records'], meta['total_length']))
@@ -0,0 +1,175 @@
+"""
+Runs BLAST requests in the background, so web server threads don't sleep through NCBI's queue.
+
+Each job is a blaster.blast_steps() generator. A single scheduler thread keeps the jobs that are waiting in a heap by
+the time they're due, and hands a due job to a small pool of threads that advance it until its next Wait; the events
+it yields on the way are appended to the job, where clients poll for them (or are woken up when they arrive).
+
+Submitting a sequence that a running job is already searching (in the same language) returns that job, so its
+clients share one event stream; blaster.blast_steps() coalesces identical requests across processes, too.
+"""
+import heapq
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import time
+from uuid import uuid4
+
+from sequencer.default_settings import BLAST_JOB_WORKERS, BLAST_JOB_TTL_SECS, BLAST_TIMEOUT
+from sequencer.support import blast_cache
+from sequencer.support.blaster import Wait, blast_steps
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class BlastJob:
+    def __init__(self, sequence, lang, database, program, query_id=None):
+        self.id = uuid4().hex
+        self.key = (blast_cache.cache_key(sequence, database, program), lang)
+        self.sequence = sequence
+        self.lang = lang
+        self.database = database
+        self.program = program
+        self.created = time()
+        self.finished = None  # time the job finished, None while it's running
+        self.events = []
+        self.steps = blast_steps(
+            sequence, lang, database=database, program=program, timeout=BLAST_TIMEOUT, query_id=query_id
+        )
+
+    @property
+    def done(self):
+        return self.finished is not None
+
+    def as_dict(self, after=0):
+        """
+        Returns the job's state and its events after the first 'after' of them.
+        """
+        return {
+            'id': self.id,
+            'sequence': self.sequence,
+            'done': self.done,
+            'num_events': len(self.events),
+            'events': self.events[after:],
+        }
+
+
+_app = None
+_jobs = {}
+_running = {}  # BlastJob.key -> job, for jobs that haven't finished
+_schedule = []  # (due time, tiebreak, job)
+_tiebreak = itertools.count()
+# guards the above; notified whenever a job is scheduled or gets new events
+_changed = threading.Condition()
+_executor = None
+_scheduler = None
+
+
+def _advance(job):
+    """
+    Runs 'job' up to its next Wait, then schedules it for when that's over.
+    """
+    try:
+        with _app.app_context():
+            for step in job.steps:
+                if isinstance(step, Wait):
+                    _enqueue(job, time() + step.seconds)
+                    return
+                with _changed:
+                    job.events.append(step)
+                    _changed.notify_all()
+    except Exception as ex:
+        logger.exception("BLAST job %s failed", job.id)
+        with _changed:
+            job.events.append({'error': str(ex)})
+
+    with _changed:
+        job.finished = time()
+        if _running.get(job.key) is job:
+            del _running[job.key]
+        _changed.notify_all()
+
+
+def _enqueue(job, due):
+    with _changed:
+        heapq.heappush(_schedule, (due, next(_tiebreak), job))
+        _changed.notify_all()
+
+
+def _expire(now):
+    for job_id in [job_id for job_id, job in _jobs.items() if job.done and now - job.finished > BLAST_JOB_TTL_SECS]:
+        del _jobs[job_id]
+
+
+def _run_scheduler():
+    while True:
+        with _changed:
+            now = time()
+            while not _schedule or _schedule[0][0] > now:
+                _changed.wait(timeout=(_schedule[0][0] - now) if _schedule else BLAST_JOB_TTL_SECS)
+                now = time()
+                _expire(now)
+            _, _, job = heapq.heappop(_schedule)
+        _executor.submit(_advance, job)
+
+
+def _start():
+    global _executor, _scheduler
+    with _changed:
+        if _scheduler is None:
+            _executor = ThreadPoolExecutor(max_workers=BLAST_JOB_WORKERS, thread_name_prefix='blast-job')
+            _scheduler = threading.Thread(target=_run_scheduler, name='blast-scheduler', daemon=True)
+            _scheduler.start()
+
+
+def submit(sequence, lang='en', database='nr', program='megablast', query_id=None):
+    """
+    Starts a BLAST job for 'sequence' and returns it without waiting for any of it to run, or returns the running job
+    that's already searching for it. With a query_id, the search is saved against (and resumed from) that Sequence row.
+    """
+    _start()
+    job = BlastJob(sequence, lang, database, program, query_id)
+    with _changed:
+        if job.key in _running:
+            return _running[job.key]
+        _jobs[job.id] = job
+        _running[job.key] = job
+    _enqueue(job, time())
+    return job
+
+
+def get_job(job_id):
+    with _changed:
+        return _jobs.get(job_id)
+
+
+def wait_for_events(job, after, timeout=None):
+    """
+    Blocks until 'job' has more than 'after' events or is done, or until 'timeout' seconds have passed.
+    :return: (the events after the first 'after', whether the job is done)
+    """
+    with _changed:
+        _changed.wait_for(lambda: len(job.events) > after or job.done, timeout=timeout)
+        return job.events[after:], job.done
+
+
+def relay(job, after=0):
+    """
+    Yields the events of 'job', starting with the first 'after' of them, as they arrive and until it's done.
+    """
+    while True:
+        events, done = wait_for_events(job, after)
+        for event in events:
+            yield event
+        after += len(events)
+        if done and not events:
+            return
+
+
+def init_app(app):
+    """
+    Jobs run in the app's context, since the steps use its cache.
+    """
+    global _app
+    _app = app
@@ -1,13 +1,20 @@
+import hashlib
 import json
 import os
 import re
-from io import StringIO
+from collections import namedtuple
+from datetime import datetime, timedelta
+from threading import Lock
 from time import sleep, time
 
-import requests
+from flask import current_app
+from sqlalchemy.exc import SQLAlchemyError
 
-from sequencer.cache import cache
-from sequencer.support.alignment import query_sequence
+from sequencer.db import db
+from sequencer.models import Sequence
+from sequencer.support import blast_cache, http_client, json2_stream, poll_timing, step_log
+from sequencer.support import local_blast
+from sequencer.support.alignment import query_sequence, unfreeze
 from sequencer.support.translations import get_translation, join_list
 
 # above disclaimer copied from NCBI's web_blast.pl reference file.
@@ -61,9 +68,14 @@ from sequencer.support.translations import get_translation, join_list
 
 from ..default_settings import (
     MOCK_BLAST,
+    COALESCE_BLAST_REQUESTS,
     USE_BLAST_CACHING,
     MIN_POLL_DELAY_SECS,
     BLAST_PARAMS,
+    BLAST_BATCH_WINDOW_SECS,
+    BLAST_BATCH_MAX_QUERIES,
+    BLAST_RID_LIFETIME_SECS,
+    NEAR_MATCH_SEARCH_EXACT,
 )
 
 
@@ -85,23 +97,201 @@ BLAST_URL = (
 )
 
 LOG_STEPS = True
-LOG_TEMPLATE = os.path.join("logs", "seq_%(seq)s_%(id)s-%(step)s.html")
 
+# results are downloaded (and parsed) this many bytes at a time
+FETCH_CHUNK_SIZE = 64 * 1024
 
-def blast_sequence_local(sequence, blast_db_dir):
-    fp = StringIO(sequence)
-    # pyblast.blastn(fp, db=blast_db_dir)
+
+def blast_sequence_local(sequence, blast_db_dir, lang='en'):
+    """
+    Searches the database in blast_db_dir for the sequence, see support.local_blast for details.
+
+    :return: incremental status updates of the form {'status': <text>}, eventually ending in {'results': [...]} in the
+    same format as blast_sequence()'s
+    """
+    db = local_blast.load_database(blast_db_dir)
+    if db is None:
+        yield {"status": get_translation("local_blast_no_db", lang)}
+        return
+
+    yield {"status": get_translation("local_blast_started", lang)}
+    hits = None
+    for done, num_shards, changed_hits in local_blast.search_sharded(sequence, blast_db_dir):
+        if num_shards > 1:
+            yield {"status": get_translation("local_blast_progress", lang).format(done=done, total=num_shards)}
+        if changed_hits is not None:
+            # the best hits so far; the client shows the latest results it got
+            hits = changed_hits
+            yield {"results": local_blast.make_report(sequence, db, hits)}
+
+    if not hits:
+        yield {"status": get_translation("no_hits_found", lang)}
+    if hits is None:
+        yield {"results": local_blast.make_report(sequence, db, [])}
+
+
+# identical requests running at the same time share one NCBI search; the first claims it by creating a file named
+# after the cache key in this instance folder subdirectory, and the others follow the search it writes to it
+INFLIGHT_DIR = "blast_inflight"
+# claims older than this are from processes that died before releasing them
+INFLIGHT_STALE_SECS = 15 * 60
+
+
+class _StepLogger:
+    """
+    Called with each step's response of the query, saves it for posterity if LOG_STEPS is enabled (in the
+    background, see step_log).
+    """
+
+    def __init__(self, sequence):
+        self.sequence = sequence
+
+    def __call__(self, content, step, rid=None):
+        if LOG_STEPS:
+            step_log.log(self.sequence, step, content, rid=rid)
+
+    def stream(self, step, rid=None):
+        """
+        Returns a step_log.Recorder to write a step's response to as it's downloaded, or None if LOG_STEPS is off.
+        """
+        return step_log.Recorder(self.sequence, step, rid=rid) if LOG_STEPS else None
+
+
+def _inflight_path(cache_key):
+    digest = hashlib.sha1(cache_key.encode("utf-8")).hexdigest()
+    return os.path.join(current_app.instance_path, INFLIGHT_DIR, digest + ".json")
+
+
+def _claim_inflight(path):
+    """
+    Creates the claim file at 'path', returning whether it didn't exist yet (or was stale).
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        if time() - os.path.getmtime(path) > INFLIGHT_STALE_SECS:
+            _release_inflight(path)
+    except OSError:
+        pass
+    try:
+        os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return True
+    except FileExistsError:
+        return False
+
+
+def _read_inflight(path):
+    """
+    Returns what the claim's owner wrote to it, None if it hasn't submitted its request yet.
+    """
+    try:
+        with open(path) as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_inflight(path, info):
+    tmp_path = "%s.%d.tmp" % (path, os.getpid())
+    with open(tmp_path, "w") as fp:
+        json.dump(info, fp)
+    os.replace(tmp_path, path)
+
+
+def _release_inflight(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+# searches in these states can be polled again by a client that reconnects, as long as the RID hasn't expired
+RESUMABLE_STATUSES = ("waiting", "timeout")
+
+
+def _find_resumable(sequence, query_id):
+    """
+    Returns the Sequence row of a search for sequence that NCBI still has, preferring query_id's own, or None.
+    """
+    cutoff = datetime.now() - timedelta(seconds=BLAST_RID_LIFETIME_SECS)
+    try:
+        return Sequence.query.filter(
+            Sequence.blast_query == sequence,
+            Sequence.blast_rid.isnot(None),
+            Sequence.blast_status.in_(RESUMABLE_STATUSES),
+            Sequence.blast_submitted > cutoff,
+        ).order_by((Sequence.id == query_id).desc(), Sequence.blast_submitted.desc()).first()
+    except SQLAlchemyError as ex:
+        current_app.logger.warning("Can't look up resumable searches for %s: %s", sequence, ex)
+        db.session.rollback()
+        return None
+
+
+def _save_search(query_id, **columns):
+    """
+    Sets the blast_* columns of query_id's Sequence row.
+    """
+    try:
+        row = db.session.get(Sequence, query_id)
+        if row is None:
+            return
+        for name, value in columns.items():
+            setattr(row, "blast_" + name, value)
+        db.session.commit()
+    except SQLAlchemyError as ex:
+        current_app.logger.warning("Can't save search state of query %s: %s", query_id, ex)
+        db.session.rollback()
+
+
+def _track_search(steps, batch, index, sequence, query_id, submitted=None):
+    """
+    Passes on await_batch()'s steps, saving the batch's RID once it has one, and its final state, against query_id.
+    """
+    saved = False
+    try:
+        for step in steps:
+            if batch.rid and not saved:
+                saved = True
+                _save_search(
+                    query_id, query=sequence, rid=batch.rid, query_index=index,
+                    submitted=submitted or datetime.now(), status="waiting"
+                )
+            yield step
+    finally:
+        # a search whose client went away before it finished stays "waiting", so it can be resumed
+        if saved and batch.state in ("ready", "no_hits", "timeout", "failed"):
+            _save_search(query_id, status=batch.state)
+
+
+# yielded by blast_steps() where blast_sequence() sleeps
+Wait = namedtuple("Wait", ["seconds"])
 
 
 def blast_sequence(sequence, lang, database="nr", program="megablast", timeout=None):
     """
-    Initiate a BLAST request against NCBI's servers, wait for result, then eventually return it.
+    Initiate a BLAST request against NCBI's servers, wait for result, then eventually return it. Blocks the calling
+    thread while waiting; support.blast_jobs runs the same steps without doing so.
+
+    :return: incremental status updates of the form {'status': <text>}, eventually ending in {'results': [...]}
+    """
+    for step in blast_steps(sequence, lang, database=database, program=program, timeout=timeout):
+        if isinstance(step, Wait):
+            sleep(step.seconds)
+        else:
+            yield step
+
+
+def blast_steps(sequence, lang, database="nr", program="megablast", timeout=None, query_id=None):
+    """
+    The steps of a BLAST request against NCBI's servers: like blast_sequence(), but instead of sleeping it yields
+    Wait(seconds) and expects to be resumed once that time has passed.
 
     :param sequence: the query sequence, a string of (A,C,T,G)s
     :param database: a string identifying the database against which to run the query
     :param program: the program to use to execute the query, one of (megablast, blastn, blastp, rpsblast, blastx,
     tblastn, tblastx)
     :param timeout: time to wait in seconds (past the estimate) for a result before aborting, None will wait forever
+    :param query_id: the id of the Sequence row the search's RID and state are saved against, if any; a search for
+    the same sequence that NCBI still has (preferably this row's) is resumed rather than submitted again
     :return: incremental status updates of the form {'status': <text>}, eventually ending in {'results': [...]}
     """
     # check if the sequence is example
@@ -111,9 +301,9 @@ def blast_sequence(sequence, lang, database="nr", program="megablast", timeout=N
 
 
     if name != "general":
-        sleep(2)
+        yield Wait(2)
         yield {"status": get_fun_fact(lang=lang)}
-        sleep(5)
+        yield Wait(5)
         if variants:
             var_string = get_translation("variants", lang).format(
                 variants=join_list(variants, lang)
@@ -125,37 +315,404 @@ def blast_sequence(sequence, lang, database="nr", program="megablast", timeout=N
                 name=gene, variants=var_string)
         }
         
-        sleep(3)
+        yield Wait(3)
         # mock the blast result, return the best alignment, and terms to google images
         search_term=(get_translation("examples_search_term", lang).format(gene=gene))
+        json_data = unfreeze(json_data)  # the cached result is shared, so modify a copy
         json_data["BlastOutput2"][0]["report"]["results"]["search"]["hits"][0]["description"][0]["sciname"] = search_term
         yield {"results": json_data}
         return
     else:
         yield {"status": get_translation("blast_started", lang)}
-    # pre-step: check if we have it cached
-    cache_key = "BLAST:%s_%s_%s" % (sequence, database, program)
-    cached_val = cache.get(cache_key) if USE_BLAST_CACHING else None
-    if cached_val:
-        sleep(2)
-        yield {"status": get_fun_fact(lang=lang)}
-        sleep(3)
-        yield ({"status": get_translation("blast_cached", lang)},)
-        yield {"results": cached_val}
-        return
+    # pre-step: check if we have it cached, or if an identical request is already running (in this or another
+    # process), in which case we follow that one instead of submitting another
+    cache_key = blast_cache.cache_key(sequence, database, program)
+    inflight_path = _inflight_path(cache_key) if COALESCE_BLAST_REQUESTS else None
+    while True:
+        claimed = inflight_path is None or _claim_inflight(inflight_path)
+        cached_val = blast_cache.load(cache_key) if USE_BLAST_CACHING else None
+        if cached_val:
+            if claimed and inflight_path:
+                _release_inflight(inflight_path)
+            yield Wait(2)
+            yield {"status": get_fun_fact(lang=lang)}
+            yield Wait(3)
+            yield {"status": get_translation("blast_cached", lang)}
+            yield {"results": cached_val}
+            return
+
+        if claimed:
+            break
 
-    # if it LOG_STEPS is enabled it saves each step in the seq query for posterity
-    step_idx = 1
+        inflight = _read_inflight(inflight_path)
+        if inflight:
+            yield {"status": get_translation("blast_coalesced", lang)}
+            batch = _follow_batch(inflight["rid"], inflight["rtoe"], database, program, timeout)
+            yield from await_batch(batch, inflight["index"], cache_key, lang, _StepLogger(sequence))
+            return
+        # whoever claimed it hasn't submitted it yet
+        yield Wait(1)
+
+    def await_search(batch, index, submitted=None):
+        steps = await_batch(batch, index, cache_key, lang, _StepLogger(sequence), inflight_path)
+        if query_id is not None:
+            steps = _track_search(steps, batch, index, sequence, query_id, submitted)
+        return steps
 
-    def log_step(this_resp, step):
-        nonlocal step_idx
-        if LOG_STEPS:
-            with open(
-                LOG_TEMPLATE % {"seq": sequence, "id": step_idx, "step": step}, "wb"
-            ) as fp:
-                fp.write(this_resp.content)
-                step_idx += 1
+    try:
+        # a sequence a base or two off from one that's cached is likely the same bricks, misread
+        near = blast_cache.load_similar(sequence, database, program) if USE_BLAST_CACHING else None
+        if near:
+            near_sequence, mismatches, near_result = near
+            yield {"status": get_translation("blast_cached_approximate", lang).format(mismatches=mismatches)}
+            yield {
+                "results": near_result,
+                "approximate": True,
+                "cached_sequence": near_sequence,
+                "mismatches": mismatches,
+            }
+            if not NEAR_MATCH_SEARCH_EXACT:
+                return
+            yield {"status": get_translation("blast_searching_exact", lang)}
+
+        previous = _find_resumable(sequence, query_id)
+        if previous:
+            # the row's session ends at the next Wait, so keep its values instead
+            row_id, rid = previous.id, previous.blast_rid
+            yield {"status": get_translation("blast_resumed", lang)}
+            batch = _follow_batch(rid, 0, database, program, timeout)
+            try:
+                yield from await_search(batch, previous.blast_query_index, previous.blast_submitted)
+                return
+            except Exception as ex:
+                # NCBI can drop a search before its RID's lifetime is up, so start over
+                current_app.logger.warning("Can't resume search %s, submitting it again: %s", rid, ex)
+                _save_search(row_id, status="failed")
+
+        batch, index = _join_batch(sequence, database, program, timeout)
+        yield from await_search(batch, index)
+    finally:
+        if inflight_path:
+            _release_inflight(inflight_path)
+
+
+# ------------------------------------------------------
+# --- batched NCBI searches
+# ------------------------------------------------------
+
+class BlastBatch:
+    """
+    One NCBI search for the queries of the requests that arrived within BLAST_BATCH_WINDOW_SECS of each other. The
+    generators waiting for it take turns making its requests, so it's submitted once and polled by one of them at a
+    time, however many there are.
+    """
 
+    def __init__(self, database, program, timeout, deadline):
+        self.database = database
+        self.program = program
+        self.timeout = timeout
+        self.deadline = deadline  # when the batch is submitted
+        self.queries = []
+        self.state = "open"  # then waiting, fetching and one of ready, no_hits, timeout, failed
+        self.busy = False  # whether one of the generators is making a request for it
+        self.error = None
+        self.rid = None
+        self.rtoe = None
+        self.next_poll = None
+        self.submitted = None  # when it was submitted, if by this process
+        self.timing_key = None  # see poll_timing
+        self.last_waiting = None  # seconds after that the last poll found it still waiting
+        self.polls = 0
+        self.wait_time = 0  # the wait announced by the last poll
+        self.total_wait = 0  # total wait before that one
+        # query index -> {"fields": the search's fields, "hits": hits so far, "entry": its blast_cache.CompactEntry},
+        # filled in while the results are being fetched
+        self.partial = {}
+        self.results = None  # query index -> JSON2_S result, once ready
+
+
+# all of the below are guarded by _batches_lock
+_batches_lock = Lock()
+# (database, program) -> the batch still taking queries
+_open_batches = {}
+# RID -> batch, for batches that are waiting
+_batches_by_rid = {}
+
+
+def _join_batch(sequence, database, program, timeout):
+    """
+    Adds sequence to the batch that's open, opening one if there's none.
+    :return: (the batch, the index of the sequence's query in it)
+    """
+    with _batches_lock:
+        batch = _open_batches.get((database, program))
+        if batch is None or len(batch.queries) >= BLAST_BATCH_MAX_QUERIES:
+            batch = BlastBatch(database, program, timeout, time() + BLAST_BATCH_WINDOW_SECS)
+            _open_batches[(database, program)] = batch
+        if sequence not in batch.queries:
+            batch.queries.append(sequence)
+        if len(batch.queries) >= BLAST_BATCH_MAX_QUERIES:
+            batch.deadline = time()
+        return batch, batch.queries.index(sequence)
+
+
+def _follow_batch(result_id, estimated_completion_secs, database, program, timeout):
+    """
+    Returns the batch that's waiting for result_id, creating it if it was submitted by another process.
+    """
+    with _batches_lock:
+        batch = _batches_by_rid.get(result_id)
+        if batch is None:
+            batch = BlastBatch(database, program, timeout, time())
+            batch.state, batch.rid, batch.rtoe = "waiting", result_id, estimated_completion_secs
+            batch.next_poll = time() + estimated_completion_secs
+            batch.total_wait = estimated_completion_secs
+            _batches_by_rid[result_id] = batch
+        return batch
+
+
+def _finish_batch(batch, state, **attrs):
+    with _batches_lock:
+        batch.state = state
+        for name, value in attrs.items():
+            setattr(batch, name, value)
+        if _batches_by_rid.get(batch.rid) is batch:
+            del _batches_by_rid[batch.rid]
+
+
+def _submit_batch(batch, log_step):
+    with _batches_lock:
+        if _open_batches.get((batch.database, batch.program)) is batch:
+            del _open_batches[(batch.database, batch.program)]
+        queries = list(batch.queries)
+
+    submitted = time()
+    result_id, estimated_completion_secs = submit_blast(queries, batch.database, batch.program, log_step)
+    # poll when searches like this one usually finish, rather than when NCBI guesses it will
+    timing_key = poll_timing.timing_key(batch.database, batch.program, queries)
+    first_wait = poll_timing.next_delay(timing_key, time() - submitted, estimated_completion_secs)
+
+    with _batches_lock:
+        batch.state, batch.rid, batch.rtoe = "waiting", result_id, estimated_completion_secs
+        batch.submitted, batch.timing_key = submitted, timing_key
+        batch.next_poll = time() + first_wait
+        batch.total_wait = first_wait
+        _batches_by_rid[result_id] = batch
+
+
+def _poll_batch(batch, log_step):
+    status, wait_time = poll_blast(batch.rid, log_step)
+    if batch.submitted is not None:
+        elapsed = time() - batch.submitted
+        if status == "WAITING":
+            batch.last_waiting = elapsed
+            wait_time = poll_timing.next_delay(batch.timing_key, elapsed, wait_time)
+        elif status == "READY":
+            # it finished some time since it was last seen waiting (or was submitted); taking the upper bound would
+            # never let the polls move earlier than they started out
+            poll_timing.record(batch.timing_key, ((batch.last_waiting or 0) + elapsed) / 2)
+
+    if status == "WAITING":
+        if batch.timeout is not None and batch.total_wait + wait_time > batch.timeout:
+            _finish_batch(batch, "timeout")
+        else:
+            with _batches_lock:
+                batch.polls += 1
+                batch.wait_time = wait_time
+                batch.total_wait += wait_time
+                batch.next_poll = time() + wait_time
+
+    elif status == "UNKNOWN":
+        _finish_batch(batch, "failed", error="Search for %s expired, terminating" % batch.rid)
+
+    elif status == "READY":
+        # fetched by the next turn, in a request slot of its own
+        with _batches_lock:
+            batch.state = "fetching"
+
+    else:
+        _finish_batch(batch, "no_hits")
+
+
+def _fetch_batch(batch, log_step):
+    """
+    Fetches the batch's results, adding each query's hits to batch.partial as they're parsed and yielding after each
+    batch of them.
+    """
+    indices = {}  # report position -> query index
+    document = None
+    for event in fetch_blast(batch.rid, log_step):
+        if event[0] == "search":
+            _, position, fields = event
+            indices[position] = index = _query_index(fields, position)
+            with _batches_lock:
+                batch.partial[index] = {
+                    "fields": fields, "hits": [], "entry": blast_cache.CompactEntry(fields.get("query_len"))
+                }
+        elif event[0] == "hits":
+            _, position, hits = event
+            partial = batch.partial[indices[position]]
+            with _batches_lock:
+                partial["hits"].extend(hits)
+            if partial["entry"] is not None:
+                try:
+                    partial["entry"].add_hits(hits)
+                except (KeyError, IndexError, TypeError) as ex:
+                    current_app.logger.warning("Not caching results for %s, unexpected hit: %s", batch.rid, ex)
+                    partial["entry"] = None
+            yield
+        else:
+            document = event[1]
+
+    # the parsed document has empty hit lists; put the hits back in and split it by query
+    results = {}
+    for position, report in enumerate(document.get("BlastOutput2", [])):
+        search = report.get("report", {}).get("results", {}).get("search", {})
+        index = indices.get(position, _query_index(search, position))
+        if index in batch.partial:
+            search["hits"] = batch.partial[index]["hits"]
+        results[index] = dict(document, BlastOutput2=[report])
+    _finish_batch(batch, "ready", results=results)
+
+
+def _partial_result(batch, index, shown):
+    """
+    Returns the result of query 'index' with the hits fetched so far, or None if there aren't more than 'shown'.
+    """
+    with _batches_lock:
+        partial = batch.partial.get(index)
+        if partial is None or len(partial["hits"]) <= shown:
+            return None
+        search = dict(partial["fields"], hits=list(partial["hits"]))
+    return {"BlastOutput2": [{"report": {"results": {"search": search}}}]}
+
+
+def await_batch(batch, index, cache_key, lang, log_step, inflight_path=None):
+    """
+    Waits for the batch to complete like blast_steps() does for a single request, then caches the results of query
+    'index' under cache_key and yields them. When the batch is submitted, its RID is written to inflight_path so other
+    processes can follow it.
+    """
+    announced = False
+    polls_seen = 0
+    fetching_announced = False
+    hits_shown = 0
+    while True:
+        # make the batch's next request if it's due and nobody else is making it
+        with _batches_lock:
+            now = time()
+            action = None
+            if not batch.busy:
+                if batch.state == "open" and now >= batch.deadline:
+                    action = _submit_batch
+                elif batch.state == "waiting" and now >= batch.next_poll:
+                    action = _poll_batch
+                elif batch.state == "fetching":
+                    action = _fetch_batch
+            if action:
+                batch.busy = True
+        if action:
+            try:
+                # requests to NCBI are rate limited, so wait for this one's turn
+                delay = http_client.reserve(BLAST_URL)
+                if delay > 0:
+                    yield Wait(delay)
+                if action is _fetch_batch:
+                    fetching_announced = True
+                    yield {"status": "Completed! Fetching results..."}
+                    # the results are parsed as they're downloaded, so show the hits as they come in
+                    for _ in action(batch, log_step):
+                        result = _partial_result(batch, index, hits_shown)
+                        if result:
+                            hits_shown = len(result["BlastOutput2"][0]["report"]["results"]["search"]["hits"])
+                            yield {"results": result}
+                else:
+                    action(batch, log_step)
+            except Exception as ex:
+                _finish_batch(batch, "failed", error=str(ex))
+                raise
+            finally:
+                with _batches_lock:
+                    batch.busy = False
+            continue
+
+        # ------------------------------------------------------
+        # --- report on the batch's progress
+        # ------------------------------------------------------
+        if batch.rid and not announced:
+            announced = True
+            if inflight_path:
+                _write_inflight(inflight_path, {"rid": batch.rid, "rtoe": batch.rtoe, "index": index})
+            # a batch that another request has already seen through needs no wait announced
+            if batch.state == "waiting":
+                yield {
+                    "status": get_translation("waiting_for_results", lang).format(
+                        batch.rtoe, batch.rid
+                    ),
+                    "job_id": batch.rid,
+                }
+                yield Wait(2)
+                yield {"status": get_fun_fact(lang=lang)}
+                continue
+
+        if batch.state == "waiting" and batch.polls > polls_seen:
+            polls_seen = batch.polls
+            yield {
+                "status": get_translation("not_ready", lang) % (batch.wait_time, batch.total_wait - batch.wait_time)
+            }
+
+        elif batch.state == "fetching":
+            # another generator is fetching the results; show the hits it has parsed so far
+            if not fetching_announced:
+                fetching_announced = True
+                yield {"status": "Completed! Fetching results..."}
+            result = _partial_result(batch, index, hits_shown)
+            if result:
+                hits_shown = len(result["BlastOutput2"][0]["report"]["results"]["search"]["hits"])
+                yield {"results": result}
+
+        elif batch.state == "ready":
+            if not fetching_announced:
+                yield {"status": "Completed! Fetching results..."}
+            result = batch.results.get(index)
+            if result is None:
+                yield {"status": get_translation("no_hits_found", lang)}
+                return None
+            # populate the cache with the results (whose compact entry was built while fetching them) and return them
+            if USE_BLAST_CACHING:
+                entry = batch.partial.get(index, {}).get("entry")
+                if entry is not None:
+                    blast_cache.store_entry(cache_key, entry)
+                else:
+                    blast_cache.store(cache_key, result)
+            yield {"results": result}
+            return
+
+        elif batch.state == "no_hits":
+            yield {"status": get_translation("no_hits_found", lang)}
+            return None
+
+        elif batch.state == "timeout":
+            yield {"status": get_translation("timeout", lang) % batch.timeout}
+            return None
+
+        elif batch.state == "failed":
+            raise Exception(batch.error)
+
+        # sleep until the batch's next request is due
+        if batch.busy:
+            due = now + 1
+        else:
+            due = batch.deadline if batch.state == "open" else batch.next_poll
+        yield Wait(max(due - time(), 0.1))
+
+
+def submit_blast(queries, database, program, log_step):
+    """
+    Submits a BLAST request for one or more query sequences to NCBI; several are sent as multi-FASTA, with
+    deflines that _query_index() recognizes.
+    :return: (request id, estimated seconds to completion)
+    """
     # ------------------------------------------------------
     # --- step 1. send initial request
     # ------------------------------------------------------
@@ -164,7 +721,9 @@ def blast_sequence(sequence, lang, database="nr", program="megablast", timeout=N
         "CMD": "Put",
         "PROGRAM": program,
         "DATABASE": database,
-        "QUERY": sequence,
+        "QUERY": queries[0] if len(queries) == 1 else "".join(
+            ">query_%d\n%s\n" % (i, query) for i, query in enumerate(queries)
+        ),
     }
     params.update(BLAST_PARAMS)
 
@@ -172,111 +731,86 @@ def blast_sequence(sequence, lang, database="nr", program="megablast", timeout=N
         params["PROGRAM"] = "blastn"
         # params['MEGABLAST'] = 'on'
 
-    resp = requests.post(BLAST_URL, data=params)
-    log_step(resp, "init")
+    resp = http_client.post(BLAST_URL, data=params)
+    content = resp.content
 
     # parse out result id, estimated time to completion
     result_id_match = re.search(r"^ {4}RID = (.*$)", resp.text, flags=re.MULTILINE)
     estimated_completion_match = re.search(
         r"^ {4}RTOE = (.*$)", resp.text, flags=re.MULTILINE
     )
+    log_step(content, "init", result_id_match.group(1) if result_id_match else None)
 
     try:
-        result_id = result_id_match.group(1)
-        estimated_completion_secs = int(estimated_completion_match.group(1))
+        return result_id_match.group(1), int(estimated_completion_match.group(1))
     except (AttributeError, ValueError):
         raise Exception("Unable to parse request id or completion time out of response")
 
-    # ------------------------------------------------------
-    # --- step 2. wait estimated time until we should check for response
-    # ------------------------------------------------------
-    yield {
-        "status": get_translation("waiting_for_results", lang).format(
-            estimated_completion_secs, result_id
-        ),
-        "job_id": result_id,
-    }
-    sleep(2)
-    yield {"status": get_fun_fact(lang=lang)}
-    sleep(estimated_completion_secs)
 
+def poll_blast(result_id, log_step):
+    """
+    Checks on a submitted BLAST request.
+    :return: (NCBI's status, one of WAITING, READY, UNKNOWN or something else if there were no hits; the number of
+    seconds to wait before polling again)
+    """
     # ------------------------------------------------------
     # --- step 3. poll regularly for completion
     # ------------------------------------------------------
 
-    # record total wait time for sanity checking
-    total_wait = estimated_completion_secs
-    # establish timeout if it was specified
-    end_time = time() + timeout if timeout else None
-    status_idx = 0
-
-    while True:
-        status_idx += 1
-
-        # if end_time and time() > end_time:
-        #     yield {"status": "Timeout of %d seconds reached while waiting for results" % timeout}
-        #     return None
-
-        # poll for results using the result ID
-        resp = requests.get(
-            BLAST_URL,
-            params={"CMD": "Get", "FORMAT_OBJECT": "SearchInfo", "RID": result_id},
-        )
-        log_step(resp, "status_%d" % status_idx)
-
-        # parse out the status
-        status_match = re.search(r"\s+Status=([A-Z]+)", resp.text, flags=re.MULTILINE)
-
-        if not status_match:
-            raise Exception("No parseable status in response")
-
-        status = status_match.group(1)
-
-        if status == "WAITING":
-            # parse out the estimated wait time ("updated in 12 seconds")
-            parsed_wait_time = re.search(
-                r"updated in <b>(.+)</b> seconds", resp.text, flags=re.MULTILINE
-            )
-            wait_time = max(
-                int(parsed_wait_time.group(1)) if parsed_wait_time else 5,
-                MIN_POLL_DELAY_SECS,
-            )
-
-            if total_wait + wait_time > timeout:
-                yield {"status": get_translation("timeout", lang) % timeout}
-                return None
+    # poll for results using the result ID
+    resp = http_client.get(
+        BLAST_URL,
+        params={"CMD": "Get", "FORMAT_OBJECT": "SearchInfo", "RID": result_id},
+    )
+    log_step(resp.content, "status", result_id)
 
-            yield {
-                "status": get_translation("not_ready", lang) % (wait_time, total_wait)
-            }
-            total_wait += wait_time
-            sleep(wait_time)
-            continue
+    # parse out the status
+    status_match = re.search(r"\s+Status=([A-Z]+)", resp.text, flags=re.MULTILINE)
 
-        elif status == "UNKNOWN":
-            raise Exception("Search for %s expired, terminating" % result_id)
+    if not status_match:
+        raise Exception("No parseable status in response")
 
-        elif status == "READY":
-            yield {"status": "Completed! Fetching results..."}
-            break
+    # parse out the estimated wait time ("updated in 12 seconds")
+    parsed_wait_time = re.search(
+        r"updated in <b>(.+)</b> seconds", resp.text, flags=re.MULTILINE
+    )
+    wait_time = max(
+        int(parsed_wait_time.group(1)) if parsed_wait_time else 5,
+        MIN_POLL_DELAY_SECS,
+    )
+    return status_match.group(1), wait_time
 
-        else:
-            yield {"status": get_translation("no_hits_found", lang)}
-            return None
 
+def fetch_blast(result_id, log_step):
+    """
+    Fetches the JSON2_S results of a completed BLAST request, yielding json2_stream.parse()'s events as they're
+    downloaded.
+    """
     # ------------------------------------------------------
     # --- step 4. retrieve results
     # ------------------------------------------------------
 
-    # we're done waiting, fetch results and return them
-    resp = requests.get(
-        BLAST_URL, params={"CMD": "Get", "FORMAT_TYPE": "JSON2_S", "RID": result_id}
-    )
-    log_step(resp, "result")
+    # we're done waiting, fetch results and parse them as they arrive; the step log compresses them as they do, too,
+    # rather than keeping a copy of the whole document
+    recorder = log_step.stream("result", result_id)
+    with http_client.get(
+        BLAST_URL, params={"CMD": "Get", "FORMAT_TYPE": "JSON2_S", "RID": result_id}, stream=True
+    ) as resp:
+        def chunks():
+            for chunk in resp.iter_content(FETCH_CHUNK_SIZE):
+                if recorder is not None:
+                    recorder.write(chunk)
+                yield chunk
+
+        yield from json2_stream.parse(chunks())
+    if recorder is not None:
+        recorder.close()
 
-    # populate the cache with the results and return the result
-    parsed_result = json.loads(resp.text)
-    cache.set(cache_key, parsed_result)
-    # BLAST_CACHE[cache_key] = parsed_result
 
-    yield {"results": parsed_result}
+def _query_index(search, position):
+    """
+    Returns which query of a (multi-query) request a report is for: reports come in query order, but match them to
+    the deflines submit_blast() gave them, where NCBI echoes them.
+    """
+    match = re.search(r"\bquery_(\d+)\b", "%s %s" % (search.get("query_title", ""), search.get("query_id", "")))
+    return int(match.group(1)) if match else position
@@ -1,9 +1,12 @@
 import random
-import socket
+import threading
 import rpyc
 
-from time import sleep
-from ..default_settings import MOCK_COMM, TIME_MOD, USE_RANDOM_SEQ
+from time import sleep, time
+from ..default_settings import (
+    MOCK_COMM, TIME_MOD, USE_RANDOM_SEQ,
+    EV3_HOST, EV3_HEARTBEAT_SECS, EV3_PING_TIMEOUT_SECS, EV3_RECONNECT_MAX_BACKOFF_SECS
+)
 import logging
 logging.basicConfig(
     level=logging.INFO,
@@ -19,75 +22,238 @@ NUM_BRICKS = 28
 #BRICK_DEG = 133
 #NUM_BRICKS = 22
 
-# conn = rpyc.classic.connect('ev3dev.local')
-# ev3 = conn.modules['ev3dev.ev3']
-g_conn = None
-g_ev3 = None
-
 
 class FatalDisconnectException(Exception):
     pass
 
 
-def get_connection():
-    global g_conn, g_ev3
-    fail_count = 0
-    while fail_count < 3:
+class EV3Connection:
+    """
+    Keeps the rpyc connection to the brick open: a heartbeat thread pings it every EV3_HEARTBEAT_SECS and reconnects,
+    backing off exponentially, when that fails. Handles to the brick's motors and sensors are kept for as long as the
+    connection lasts, so requests don't have to make them again.
+
+    The lock only guards this object's state: connecting and making handles happen outside it, so a brick that takes
+    its time to answer doesn't hold up health() or the requests that don't need it.
+    """
+
+    def __init__(self, host):
+        self.host = host
+        self.lock = threading.RLock()
+        self.conn = None
+        self.ev3 = None
+        self.handles = {}
+        self.connected_since = None
+        self.last_ping = None  # (time, round trip in seconds) of the last successful ping
+        self.failures = 0  # failed connects (or pings) since the last successful one
+        self.next_attempt = 0
+        self.last_error = None
+        self.connecting = None  # an Event set when the connection attempt in progress is over
+        self.heartbeat = None
+
+    def start(self):
+        with self.lock:
+            if self.heartbeat is None:
+                self.heartbeat = threading.Thread(target=self._run_heartbeat, name='ev3-heartbeat', daemon=True)
+                self.heartbeat.start()
+
+    def get(self):
+        """
+        Returns (conn, ev3), connecting first if need be; raises FatalDisconnectException if the brick can't be
+        reached, without trying again before the backoff is over.
+        """
+        self.start()
+        while True:
+            with self.lock:
+                if self.conn is not None:
+                    return self.conn, self.ev3
+                if self.connecting is None:
+                    if time() < self.next_attempt:
+                        raise FatalDisconnectException(
+                            "Disconnected, reconnecting in %.0f seconds (%s)" % (
+                                self.next_attempt - time(), self.last_error
+                            )
+                        )
+                    self.connecting = attempt = threading.Event()
+                    break
+                attempt = self.connecting
+            # another thread is connecting; see how that went rather than trying at the same time
+            attempt.wait()
+        return self._connect(attempt)
+
+    def handle(self, kind, *args):
+        """
+        Returns the brick's ev3dev.ev3.<kind>(*args), e.g. handle('LargeMotor', 'outD').
+        """
+        _, ev3 = self.get()
+        key = (kind,) + args
+        with self.lock:
+            if self.ev3 is ev3 and key in self.handles:
+                return self.handles[key]
+        handle = getattr(ev3, kind)(*args)
+        with self.lock:
+            # kept only if the connection it was made over is still the current one
+            if self.ev3 is ev3:
+                handle = self.handles.setdefault(key, handle)
+        return handle
+
+    def lost(self, ex, reconnect=False):
+        """
+        Drops the connection after a call over it failed; the heartbeat reconnects, or with 'reconnect' the next get()
+        does right away, skipping the backoff this once.
+        """
+        with self.lock:
+            logger.warning("Lost the connection to %s: %s", self.host, ex)
+            self._fail(ex)
+            if reconnect:
+                self.next_attempt = 0
+
+    def health(self):
+        with self.lock:
+            return {
+                'host': self.host,
+                'connected': self.conn is not None,
+                'connecting': self.connecting is not None,
+                'connected_since': self.connected_since,
+                'last_ping': self.last_ping[0] if self.last_ping else None,
+                'ping_ms': round(self.last_ping[1] * 1000, 1) if self.last_ping else None,
+                'failures': self.failures,
+                'next_attempt': self.next_attempt if self.conn is None and self.failures else None,
+                'last_error': self.last_error,
+                'handles': len(self.handles),
+            }
+
+    def _connect(self, attempt):
+        """
+        Makes the connection attempt that get() registered as 'attempt', outside the lock.
+        """
         try:
-            g_ev3.Sound.speak('Welcome to the NEXUS sequencer demonstration')
-            return g_conn, g_ev3
-        except (AttributeError, socket.gaierror):
-            # increment the fail counter and try again, up to a max of 3 times
-            fail_count += 1
-            g_conn = rpyc.classic.connect('ev3dev.local')
-            g_ev3 = g_conn.modules['ev3dev.ev3']
-    raise FatalDisconnectException("Disconnected and ran out of reconnect attempts")
+            try:
+                conn = rpyc.classic.connect(self.host)
+                ev3 = conn.modules['ev3dev.ev3']
+            except Exception as ex:
+                with self.lock:
+                    self._fail(ex)
+                raise FatalDisconnectException("Can't connect to %s: %s" % (self.host, ex))
+            with self.lock:
+                self.conn, self.ev3, self.handles = conn, ev3, {}
+                self.connected_since = time()
+                self.failures = 0
+                self.last_error = None
+            logger.info("Connected to %s", self.host)
+            return conn, ev3
+        finally:
+            with self.lock:
+                self.connecting = None
+            attempt.set()
+
+    def _fail(self, ex):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+        self.conn, self.ev3, self.handles = None, None, {}
+        self.connected_since = None
+        self.failures += 1
+        self.last_error = str(ex) or ex.__class__.__name__
+        self.next_attempt = time() + min(2 ** (self.failures - 1), EV3_RECONNECT_MAX_BACKOFF_SECS)
+
+    def _run_heartbeat(self):
+        while True:
+            sleep(EV3_HEARTBEAT_SECS)
+            with self.lock:
+                conn = self.conn
+                due = conn is None and time() >= self.next_attempt
+            if conn is not None:
+                # outside the lock, so a slow ping doesn't hold up requests
+                started = time()
+                try:
+                    conn.ping(timeout=EV3_PING_TIMEOUT_SECS)
+                    with self.lock:
+                        self.last_ping = (time(), time() - started)
+                except Exception as ex:
+                    with self.lock:
+                        if self.conn is conn:
+                            logger.warning("Ping to %s failed: %s", self.host, ex)
+                            self._fail(ex)
+            elif due:
+                try:
+                    self.get()
+                except FatalDisconnectException as ex:
+                    logger.info("%s, retrying in %.0f seconds", ex, self.next_attempt - time())
+
+
+g_connection = EV3Connection(EV3_HOST)
 
 
-def nudge(direction, amount=1):
-    conn, ev3 = get_connection()
-    m = ev3.LargeMotor('outD')
+def get_connection():
+    return g_connection.get()
+
 
+def health():
+    """
+    Returns the state of the connection to the brick.
+    """
+    if MOCK_COMM:
+        return {'host': EV3_HOST, 'mock': True, 'connected': True}
+    g_connection.start()
+    return g_connection.health()
+
+
+def nudge(direction, amount=1):
     nudge_amount = (BRICK_DEG if direction == 'right' else -BRICK_DEG) * amount
-    m.run_to_rel_pos(position_sp=nudge_amount, speed_sp=900, stop_action="hold")
+
+    # a call that fails over a connection the heartbeat hasn't yet found dead is tried again once, over a new one
+    for attempt in range(2):
+        m = g_connection.handle('LargeMotor', 'outD')
+        try:
+            m.run_to_rel_pos(position_sp=nudge_amount, speed_sp=900, stop_action="hold")
+            break
+        except (EOFError, OSError) as ex:
+            if attempt:
+                g_connection.lost(ex)
+                raise FatalDisconnectException("Lost the connection while nudging: %s" % ex)
+            g_connection.lost(ex, reconnect=True)
 
     return {'msg': 'nudged %s degrees' % nudge_amount}
 
 
 def query_sequencer():
     try:
-        conn, ev3 = get_connection()
+        m = g_connection.handle('LargeMotor', 'outD')
+        sign_m = g_connection.handle('Motor', 'outC')
+        cl = g_connection.handle('ColorSensor')
     except FatalDisconnectException:
         return {'error': "Disconnected and couldn't recover the connection"}
 
-    m = ev3.LargeMotor('outD')
-    sign_m = ev3.Motor('outC')
-    cl = ev3.ColorSensor()
-    lcd = ev3.Screen()
-
-    # Put the color sensor into COL-COLOR mode.
-    cl.mode = 'COL-COLOR'
-
-    # start producing readings until we reach a white
-    counted_bricks = 0
-    last_value = COLORS[cl.value()]
-    for idx in range(NUM_BRICKS):
-        sleep(0.1)
-
-        # spin the sign 180 degrees per read
-        sign_m.run_to_rel_pos(position_sp=180, speed_sp=900)
-
-        yield {
-            'brick_id': counted_bricks,
-            'color': COLORS[cl.value()]
-        }
-        counted_bricks += 1
-
-        m.run_to_rel_pos(position_sp=-BRICK_DEG, speed_sp=200, stop_action="hold")
-        m.wait_while('running')
-
-    # rewind back to white
-    m.run_to_rel_pos(position_sp=BRICK_DEG * NUM_BRICKS, speed_sp=900, stop_action="hold")
+    try:
+        # Put the color sensor into COL-COLOR mode.
+        cl.mode = 'COL-COLOR'
+
+        # start producing readings until we reach a white
+        counted_bricks = 0
+        last_value = COLORS[cl.value()]
+        for idx in range(NUM_BRICKS):
+            sleep(0.1)
+
+            # spin the sign 180 degrees per read
+            sign_m.run_to_rel_pos(position_sp=180, speed_sp=900)
+
+            yield {
+                'brick_id': counted_bricks,
+                'color': COLORS[cl.value()]
+            }
+            counted_bricks += 1
+
+            m.run_to_rel_pos(position_sp=-BRICK_DEG, speed_sp=200, stop_action="hold")
+            m.wait_while('running')
+
+        # rewind back to white
+        m.run_to_rel_pos(position_sp=BRICK_DEG * NUM_BRICKS, speed_sp=900, stop_action="hold")
+    except (EOFError, OSError) as ex:
+        g_connection.lost(ex)
+        raise
 
 SAMPLE_SEQUENCES = {
     # >ENA|BAA20512|BAA20512.1 Cyprinus carpio (common carp) alpha-globin
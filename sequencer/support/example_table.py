@@ -0,0 +1,257 @@
+"""
+Precomputed matches for reads that are windows of the examples.
+
+Reads from the tray are usually an in-frame window of an example with zero to two bricks changed (see
+ev3_reader.get_example()), so where those windows and their substitution neighbors match is worked out once and
+looked up by alignment.query_sequence() instead of scoring the read's seed candidates. Only the match is kept, as
+alignment.find_match() returns it, packed into 16 bytes per read; the alignment and its variants are worked out from
+it when a read is looked up, which keeps a table of all 1-substitution neighbors to a few dozen MB.
+"""
+import array
+import hashlib
+import itertools
+import json
+import math
+import os
+import pickle
+import threading
+
+import click
+import numpy
+from flask import current_app
+from flask.cli import with_appcontext
+
+from sequencer.default_settings import (
+    USE_EXAMPLE_TABLE,
+    EXAMPLE_TABLE_READ_LENGTHS,
+    EXAMPLE_TABLE_MAX_SUBSTITUTIONS,
+    EXAMPLE_TABLE_MAX_BYTES,
+)
+from sequencer.support import alignment
+
+import logging
+logger = logging.getLogger(__name__)
+
+TABLE_FILENAME = 'example_table.pickle'
+# bump whenever the code changes query_sequence() results for the same read, so saved tables are rebuilt; the
+# aligner's and the seed index's settings are part of the fingerprint anyway
+TABLE_VERSION = 4
+
+# bytes per read in an ExampleTable, its packed bases and its packed match
+ENTRY_BYTES = 16
+# reads are packed into 64 bits, 2 per base and 5 for the length, so longer ones can't be in the table
+MAX_READ_LENGTH = 29
+
+_BASE_DIGITS = str.maketrans('ACGT', '0123')
+# a packed match's example number for reads that don't match any example
+_GENERAL = 0xff
+
+
+def _pack_read(read):
+    """
+    Returns 'read' packed into an int, or None if it can't be in the table.
+    """
+    if not read or len(read) > MAX_READ_LENGTH or read.strip('ACGT'):
+        return None
+    return int(read.translate(_BASE_DIGITS), 4) << 5 | len(read)
+
+
+class ExampleTable:
+    """
+    A read -> match mapping for the reads in 'keys' and their packed 'matches', as packed by build_table(); the
+    example numbers in the matches index 'names'.
+    """
+
+    def __init__(self, keys, matches, names):
+        # sorted for lookups by binary search; a read that's in there more than once keeps its first match
+        keys, first = numpy.unique(numpy.asarray(keys, dtype=numpy.uint64), return_index=True)
+        self.keys = keys
+        self.matches = numpy.asarray(matches, dtype=numpy.uint64)[first]
+        self.names = tuple(names)
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def nbytes(self):
+        return self.keys.nbytes + self.matches.nbytes
+
+    def _find(self, read):
+        key = _pack_read(read)
+        if key is None:
+            return None
+        i = int(numpy.searchsorted(self.keys, numpy.uint64(key)))
+        return i if i < len(self.keys) and self.keys[i] == key else None
+
+    def __contains__(self, read):
+        return self._find(read) is not None
+
+    def __getitem__(self, read):
+        """
+        Returns the match of 'read', as alignment.find_match() does.
+        """
+        i = self._find(read)
+        if i is None:
+            raise KeyError(read)
+        packed = int(self.matches[i])
+        if packed >> 56 == _GENERAL:
+            return None
+        start = packed & 0xffffffff
+        return self.names[packed >> 56], 'Minus' if packed >> 48 & 1 else 'Plus', start, start + (packed >> 32 & 0xffff)
+
+
+def _fingerprint(read_lengths, max_substitutions, max_bytes):
+    """
+    Identifies the examples and settings a table was built from, so stale tables on disk are rebuilt.
+    """
+    h = hashlib.sha1()
+    h.update(str(TABLE_VERSION).encode('utf-8'))
+    h.update(json.dumps(alignment.EXAMPLES, sort_keys=True).encode('utf-8'))
+    # lists all of the aligner's scoring parameters and its mode
+    h.update(str(alignment.aligner).encode('utf-8'))
+    h.update(repr((alignment.SEED_PATTERNS, alignment.SEED_BAND, alignment.SEED_MIN_COVERAGE,
+                   alignment.SEED_MAX_CANDIDATES, alignment.BANDED_ALIGNMENT,
+                   alignment.QUERY_PERCENT_IDENTITY)).encode('utf-8'))
+    h.update(repr((tuple(read_lengths), max_substitutions, max_bytes)).encode('utf-8'))
+    return h.hexdigest()
+
+
+def _windows(read_length):
+    """
+    Yields the in-frame windows of 'read_length' bases of every example, alternating between examples.
+    """
+    def example_windows(name):
+        ref = alignment.REFERENCES[name]
+        first = (alignment.EXAMPLES[name].get('cds_start', 0) - 1) % 3
+        for start in range(first, len(ref) - read_length + 1, 3):
+            yield ref[start:start + read_length]
+
+    for windows in itertools.zip_longest(*(example_windows(name) for name in alignment.REFERENCES)):
+        for window in windows:
+            if window is not None:
+                yield window
+
+
+def _substitutions(window, count):
+    """
+    Yields every variant of 'window' with exactly 'count' bases substituted.
+    """
+    for positions in itertools.combinations(range(len(window)), count):
+        for bases in itertools.product('ACGT', repeat=count):
+            if any(window[pos] == base for pos, base in zip(positions, bases)):
+                continue
+            read = list(window)
+            for pos, base in zip(positions, bases):
+                read[pos] = base
+            yield ''.join(read)
+
+
+def _count_reads(read_lengths, count):
+    """
+    Returns the number of reads with exactly 'count' substitutions in the example windows, duplicates included.
+    """
+    return sum(sum(1 for _ in _windows(read_length)) * math.comb(read_length, count) * 3 ** count
+               for read_length in read_lengths)
+
+
+def _pack_match(match, names):
+    """
+    Packs a match from alignment.find_match() into 64 bits: the example's number in 'names' (8 bits), the strand
+    (1 bit), the length of the reference window (16 bits) and its start (32 bits).
+    """
+    if match is None:
+        return _GENERAL << 56
+    name, strand, start, end = match
+    return names.index(name) << 56 | (strand == 'Minus') << 48 | (end - start) << 32 | start
+
+
+def build_table(read_lengths=EXAMPLE_TABLE_READ_LENGTHS, max_substitutions=EXAMPLE_TABLE_MAX_SUBSTITUTIONS,
+                max_bytes=EXAMPLE_TABLE_MAX_BYTES):
+    """
+    Finds where the example windows match, then all of their 1-substitution neighbors, and so on up to
+    'max_substitutions'. A number of substitutions whose neighbors would take the table past 'max_bytes' is left out
+    entirely, along with the ones after it, so every window has the same neighbors in the table.
+    :return: an ExampleTable
+    """
+    names = list(alignment.REFERENCES)
+    keys, matches = array.array('Q'), array.array('Q')
+    read_lengths = [length for length in read_lengths if length <= MAX_READ_LENGTH]
+    covered = -1
+    for count in range(max_substitutions + 1):
+        estimate = _count_reads(read_lengths, count) * ENTRY_BYTES
+        if len(keys) * ENTRY_BYTES + estimate > max_bytes:
+            logger.info("Leaving windows with %d substitutions out of the example table, they'd take about %d "
+                        "more bytes", count, estimate)
+            break
+        for read_length in read_lengths:
+            for window in _windows(read_length):
+                for read in (_substitutions(window, count) if count else (window,)):
+                    keys.append(_pack_read(read))
+                    match = alignment.find_match(read, percent_identity=alignment.QUERY_PERCENT_IDENTITY)
+                    matches.append(_pack_match(match, names))
+        covered = count
+    table = ExampleTable(keys, matches, names)
+    logger.info("Built example table with %d reads (%d bytes), covering windows with up to %d substitutions",
+                len(table), table.nbytes, covered)
+    return table
+
+
+def save_table(table, path, fingerprint):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as fp:
+        pickle.dump({'fingerprint': fingerprint, 'table': table}, fp, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)  # other processes never see a partially-written table
+
+
+def load_table(path, fingerprint):
+    """
+    Returns the table saved at 'path', or None if there's none or it was built from other examples or settings.
+    """
+    try:
+        with open(path, 'rb') as fp:
+            saved = pickle.load(fp)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+    if saved.get('fingerprint') != fingerprint:
+        return None
+    return saved['table']
+
+
+def _build_and_install(path, fingerprint):
+    table = build_table()
+    alignment.EXAMPLE_TABLE = table
+    try:
+        save_table(table, path, fingerprint)
+    except OSError as ex:
+        logger.warning("Couldn't save the example table to %s: %s", path, ex)
+
+
+def init_app(app):
+    """
+    Installs the example table saved in the instance folder, or builds it in the background if it's missing or stale.
+    """
+    app.cli.add_command(build_example_table_command)
+    if not USE_EXAMPLE_TABLE:
+        return
+
+    path = os.path.join(app.instance_path, TABLE_FILENAME)
+    fingerprint = _fingerprint(EXAMPLE_TABLE_READ_LENGTHS, EXAMPLE_TABLE_MAX_SUBSTITUTIONS, EXAMPLE_TABLE_MAX_BYTES)
+    table = load_table(path, fingerprint)
+    if table is not None:
+        alignment.EXAMPLE_TABLE = table
+        return
+
+    # reads are aligned as usual until the table is ready
+    threading.Thread(target=_build_and_install, args=(path, fingerprint), daemon=True).start()
+
+
+@click.command('build-example-table')
+@with_appcontext
+def build_example_table_command():
+    """Precompute the example windows table and save it to the instance folder."""
+    path = os.path.join(current_app.instance_path, TABLE_FILENAME)
+    click.echo('Building the example table...')
+    table = build_table()
+    save_table(table, path, _fingerprint(EXAMPLE_TABLE_READ_LENGTHS, EXAMPLE_TABLE_MAX_SUBSTITUTIONS,
+                                         EXAMPLE_TABLE_MAX_BYTES))
+    click.echo('Saved %d reads to %s.' % (len(table), path))
@@ -0,0 +1,88 @@
+"""
+Outgoing HTTP requests, over one pooled keep-alive session per host.
+
+Hosts listed in HOST_MIN_REQUEST_INTERVAL_SECS are rate limited process-wide: callers reserve the host's next free
+slot with reserve(), first come first served, and wait until it comes (by yielding a Wait, see
+blaster.await_batch()).
+"""
+from threading import Lock
+from time import monotonic
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from sequencer.default_settings import HTTP_POOL_SIZE, HTTP_TIMEOUT_SECS, HOST_MIN_REQUEST_INTERVAL_SECS
+
+import logging
+logger = logging.getLogger(__name__)
+
+# re-exported so callers needn't import requests for its exceptions
+RequestException = requests.RequestException
+
+
+class RateLimiter:
+    """
+    Hands out request slots at least 'interval' seconds apart, in the order they're asked for.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.next_slot = 0.0
+        self.lock = Lock()
+
+    def reserve(self):
+        """
+        Books the next free slot and returns the number of seconds until it.
+        """
+        with self.lock:
+            now = monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+            return slot - now
+
+
+_sessions = {}
+_limiters = {host: RateLimiter(interval) for host, interval in HOST_MIN_REQUEST_INTERVAL_SECS.items()}
+_sessions_lock = Lock()
+
+
+def get_session(url):
+    """
+    Returns the session shared by all requests to url's host.
+    """
+    host = urlsplit(url).netloc
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _sessions[host] = session
+        return session
+
+
+def reserve(url):
+    """
+    Books a slot for a request to url's host, returning the number of seconds to wait before sending it (always 0 for
+    hosts that aren't rate limited).
+    """
+    limiter = _limiters.get(urlsplit(url).hostname)
+    return limiter.reserve() if limiter else 0
+
+
+def request(method, url, **kwargs):
+    """
+    Like requests.request(), over the host's pooled session and with a default timeout; doesn't wait for a slot.
+    """
+    kwargs.setdefault('timeout', HTTP_TIMEOUT_SECS)
+    return get_session(url).request(method, url, **kwargs)
+
+
+def get(url, **kwargs):
+    return request('GET', url, **kwargs)
+
+
+def post(url, **kwargs):
+    return request('POST', url, **kwargs)
@@ -0,0 +1,164 @@
+"""
+Incremental parsing of NCBI's JSON2_S BLAST results.
+
+parse() reads the document from an iterable of byte chunks (e.g. a streamed response) and hands back each report's
+hits as soon as they're decoded, without ever holding the whole text: only the document's small skeleton is walked
+token by token, while each hit is decoded in one go with the json module once all of its text has arrived.
+"""
+import codecs
+import json
+import re
+
+# a structural token or scalar, after optional whitespace; strings (keys included) are kept whole
+_TOKEN = re.compile(r'\s*(?:("(?:[^"\\]|\\.)*")|([{}\[\]:,])|([^\s{}\[\]:,"]+))')
+
+# where each report's search, and its list of hits, are; '#' is any index of an array
+_SEARCH_PATH = ("BlastOutput2", "#", "report", "results", "search")
+_HITS_PATH = _SEARCH_PATH + ("hits",)
+
+# bytes to keep around once consumed before trimming the buffer
+_TRIM_SIZE = 64 * 1024
+
+
+class _Frame:
+    def __init__(self, is_object):
+        self.is_object = is_object
+        self.index = 0  # for arrays, the index of the current item
+        self.current_key = None  # for objects, the key of the current value
+        self.expect_key = is_object
+
+
+def parse(chunks, first_batch=10, max_batch=100):
+    """
+    Parses the JSON2_S document in 'chunks' (bytes), yielding as it goes:
+    - ("search", position, fields) when the hits of the report at 'position' start, with the search's fields that
+      precede them (query_id, query_title, query_len, ...)
+    - ("hits", position, hits) with the report's next hits; the first batch has 'first_batch' of them, each later
+      one twice as many as the one before, up to 'max_batch'
+    - ("document", document) once it's done, with the document's hit lists left empty
+
+    Raises ValueError if the document is malformed or incomplete.
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    pos = 0
+    skeleton = []  # the document's text, minus the hits
+    skeleton_len = 0
+    stack = []
+    search_start = key_start = None  # offsets into the skeleton
+    in_hits = False
+    pending = []  # hits decoded but not yet handed back
+    batch_size = first_batch
+    chunks = iter(chunks)
+    final = False
+
+    def path():
+        return tuple("#" if not frame.is_object else frame.current_key for frame in stack)
+
+    def keep(token):
+        nonlocal skeleton_len
+        skeleton.append(token)
+        skeleton_len += len(token)
+
+    def search_fields():
+        # the search object so far, up to (but not including) its "hits" key, closed off
+        prefix = "".join(skeleton)[search_start:key_start].rstrip().rstrip(",")
+        return json.loads(prefix + "}")
+
+    while True:
+        # read more once what's buffered has run out (or ends in the middle of a token)
+        if not final:
+            chunk = next(chunks, None)
+            if chunk is None:
+                final = True
+                buf += text_decoder.decode(b"", final=True)
+            else:
+                buf += text_decoder.decode(chunk)
+            if pos > _TRIM_SIZE:
+                buf, pos = buf[pos:], 0
+
+        while True:
+            if in_hits:
+                # skip to the next hit, or the end of the list
+                match = _TOKEN.match(buf, pos)
+                if match is None or (match.end() == len(buf) and not final and match.group(3)):
+                    break
+                token = match.group(2)
+                if token == ",":
+                    pos = match.end()
+                    continue
+                if token == "]":
+                    in_hits = False
+                    pos = match.end()
+                    if pending:
+                        yield "hits", stack[1].index, pending
+                        pending = []
+                    stack.pop()
+                    keep("]")
+                    continue
+                start = match.start(match.lastindex)
+                try:
+                    hit, end = decoder.raw_decode(buf, start)
+                except json.JSONDecodeError:
+                    if final:
+                        raise ValueError("Malformed hit at offset %d" % start)
+                    break
+                pos = end
+                pending.append(hit)
+                if len(pending) >= batch_size:
+                    yield "hits", stack[1].index, pending
+                    pending = []
+                    batch_size = min(batch_size * 2, max_batch)
+                continue
+
+            match = _TOKEN.match(buf, pos)
+            if match is None or match.end() == len(buf) and not final and (match.group(3) or match.group(1)):
+                # a string or scalar at the very end of the buffer may go on in the next chunk
+                break
+            string, structural, scalar = match.groups()
+            pos = match.end()
+            frame = stack[-1] if stack else None
+
+            if string is not None and frame is not None and frame.is_object and frame.expect_key:
+                frame.current_key = json.loads(string)
+                frame.expect_key = False
+                key_start = skeleton_len
+                keep(string)
+            elif structural in ("{", "["):
+                stack.append(_Frame(structural == "{"))
+                current = path()[:-1]
+                if structural == "{" and _matches(current, _SEARCH_PATH):
+                    search_start = skeleton_len
+                keep(structural)
+                if structural == "[" and _matches(current, _HITS_PATH):
+                    yield "search", stack[1].index, search_fields()
+                    in_hits = True
+                    batch_size = first_batch
+            elif structural in ("}", "]"):
+                if not stack:
+                    raise ValueError("Unbalanced %r at offset %d" % (structural, match.start(2)))
+                stack.pop()
+                keep(structural)
+                if not stack:
+                    document = json.loads("".join(skeleton))
+                    if buf[pos:].strip():
+                        raise ValueError("Trailing data after the document")
+                    yield "document", document
+                    return
+            elif structural == ",":
+                if frame.is_object:
+                    frame.expect_key = True
+                else:
+                    frame.index += 1
+                keep(",")
+            else:
+                # ':' or a value
+                keep(match.group(0).lstrip())
+
+        if final:
+            raise ValueError("Incomplete document")
+
+
+def _matches(path, pattern):
+    return len(path) == len(pattern) and all(p == "#" or p == q for p, q in zip(pattern, path))
@@ -0,0 +1,393 @@
+"""
+In-process nucleotide search over the database in BLAST_DB_DIR (see support.blast_db), for when NCBI can't be reached.
+
+Follows BLAST's seed-and-extend approach: exact word hits between the query (on both strands) and the database are
+extended without gaps until the score drops too far below its best (X-drop), and the HSPs that score well enough are
+then re-aligned with gaps in a window around them. Results have the same shape as NCBI's JSON2_S output, so the
+frontend can't tell them apart.
+
+The database is split into shards of whole records that are searched in parallel by a pool of worker processes,
+each mapping the same database files; search_sharded() reports the best hits so far as the shards finish.
+"""
+import heapq
+import itertools
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from threading import Lock
+
+import numpy
+from Bio import Align
+
+from sequencer.default_settings import (
+    BLAST_PARAMS,
+    LOCAL_BLAST_XDROP,
+    LOCAL_BLAST_MIN_UNGAPPED_SCORE,
+    LOCAL_BLAST_WORKERS,
+    LOCAL_BLAST_SHARDS,
+    LOCAL_BLAST_MIN_SHARD_LENGTH,
+)
+from sequencer.support.alignment import reverse_complement
+from sequencer.support.blast_db import kmer_code, load_database
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Karlin-Altschul (lambda, K) by (reward, penalty), from NCBI's blastn tables
+KARLIN_ALTSCHUL = {
+    (1, -2): (1.28, 0.46),
+    (1, -3): (1.374, 0.711),
+    (1, -4): (1.383, 0.738),
+    (2, -3): (0.625, 0.41),
+}
+
+
+# ------------------------------------------------------
+# --- search
+# ------------------------------------------------------
+
+def _scoring(params=BLAST_PARAMS):
+    reward = int(params.get('NUCL_REWARD', 1))
+    penalty = int(params.get('NUCL_PENALTY', -3))
+    gap_open, gap_extend = (int(x) for x in params.get('GAPCOSTS', '5 2').split())
+    return reward, penalty, gap_open, gap_extend
+
+
+def _extend_ungapped(query, subject, q_pos, s_pos, length, lo, hi, reward, penalty, xdrop):
+    """
+    Extends the exact match query[q_pos:q_pos+length] == subject[s_pos:s_pos+length] in both directions without gaps,
+    stopping when the score falls more than 'xdrop' below the best so far or at the record bounds [lo, hi).
+    Returns (query start, query end, subject start, subject end, score), ends exclusive.
+    """
+    score = length * reward
+
+    # to the right
+    best, run, i = score, score, 0
+    best_i = 0
+    while q_pos + length + i < len(query) and s_pos + length + i < hi:
+        run += reward if query[q_pos + length + i] == subject[s_pos + length + i] else penalty
+        i += 1
+        if run > best:
+            best, best_i = run, i
+        elif best - run > xdrop:
+            break
+    right = best_i
+
+    # to the left
+    run, i = best, 0
+    best_i = 0
+    while q_pos - i - 1 >= 0 and s_pos - i - 1 >= lo:
+        run += reward if query[q_pos - i - 1] == subject[s_pos - i - 1] else penalty
+        i += 1
+        if run > best:
+            best, best_i = run, i
+        elif best - run > xdrop:
+            break
+    left = best_i
+
+    return q_pos - left, q_pos + length + right, s_pos - left, s_pos + length + right, best
+
+
+def _make_gapped_aligner(reward, penalty, gap_open, gap_extend):
+    aligner = Align.PairwiseAligner()
+    aligner.mode = 'local'
+    aligner.match_score = reward
+    aligner.mismatch_score = penalty
+    # BLAST charges open + extend for the first gapped position
+    aligner.open_gap_score = -(gap_open + gap_extend)
+    aligner.extend_gap_score = -gap_extend
+    return aligner
+
+
+def _midline(qseq, hseq):
+    return ''.join('|' if q == h else ' ' for q, h in zip(qseq, hseq))
+
+
+def _make_hsp(alignment, query_len, strand, window_start, lam, kappa, search_space):
+    """
+    Converts a local alignment of a query strand to a window of the database into a JSON2_S hsp. Coordinates are
+    1-based; for Minus hits the query reads forward and the hit coordinates run backwards, as in BLAST.
+    """
+    (q_start, s_start), (q_end, s_end) = alignment.coordinates[:, 0], alignment.coordinates[:, -1]
+    q_start, s_start = int(q_start), int(s_start) + window_start
+    q_end, s_end = int(q_end), int(s_end) + window_start
+    qseq, hseq = alignment[0], alignment[1]
+    score = int(alignment.score)
+
+    if strand == 'Minus':
+        qseq, hseq = reverse_complement(qseq), reverse_complement(hseq)
+        query_from, query_to = query_len - q_end + 1, query_len - q_start
+    else:
+        query_from, query_to = q_start + 1, q_end
+
+    return {
+        'bit_score': round((lam * score - math.log(kappa)) / math.log(2), 3),
+        'score': score,
+        'evalue': kappa * search_space * math.exp(-lam * score),
+        'identity': sum(1 for q, h in zip(qseq, hseq) if q == h),
+        'query_from': query_from,
+        'query_to': query_to,
+        'query_strand': 'Plus',
+        'hit_strand': strand,
+        'align_len': len(qseq),
+        'gaps': qseq.count('-') + hseq.count('-'),
+        'qseq': qseq,
+        'hseq': hseq,
+        'midline': _midline(qseq, hseq),
+        # subject coordinates within the concatenated database, made relative to the record by the caller
+        '_s_start': s_start,
+        '_s_end': s_end,
+    }
+
+
+def search(query, db, start=0, end=None, xdrop=LOCAL_BLAST_XDROP, min_ungapped_score=LOCAL_BLAST_MIN_UNGAPPED_SCORE,
+           params=BLAST_PARAMS):
+    """
+    Searches the PackedDatabase 'db' for 'query' on both strands, seeding with the k-mers of the database's index.
+    Only the records within [start, end) of the concatenated sequence are searched, all of them if end is None; the
+    statistics are those of the whole database either way.
+    :return: the list of JSON2_S hits, best first, at most HITLIST_SIZE of them and none above EXPECT
+    """
+    query = ''.join(query.split()).upper().replace('U', 'T')
+    reward, penalty, gap_open, gap_extend = _scoring(params)
+    lam, kappa = KARLIN_ALTSCHUL.get((reward, penalty), KARLIN_ALTSCHUL[(1, -3)])
+    search_space = len(query) * max(db.total_length, 1)
+    expect = float(params.get('EXPECT', 10))
+    hitlist_size = int(params.get('HITLIST_SIZE', 100))
+    word_size = db.k
+
+    # (strand, query position, database position) of every exact word match
+    strands = {'Plus': query, 'Minus': reverse_complement(query)}
+    seeds = []
+    for strand, seq in strands.items():
+        for q_pos in range(len(seq) - word_size + 1):
+            code = kmer_code(seq[q_pos:q_pos + word_size])
+            if code is not None:
+                positions = db.positions(code)
+                if start or end is not None:
+                    positions = positions[numpy.searchsorted(positions, start):
+                                          numpy.searchsorted(positions, db.total_length if end is None else end)]
+                seeds.extend((strand, q_pos, int(s_pos)) for s_pos in positions)
+    if not seeds:
+        return []
+    records = db.record_at(numpy.array([s_pos for _, _, s_pos in seeds], dtype=numpy.uint64))
+
+    # extend without gaps along each diagonal, skipping seeds inside an HSP already found on it
+    ungapped = []
+    extended_to = {}
+    for (strand, q_pos, s_pos), record in sorted(zip(seeds, records.tolist()), key=lambda x: x[0][2]):
+        diagonal = (strand, s_pos - q_pos)
+        if extended_to.get(diagonal, -1) > s_pos:
+            continue
+        lo, hi = db.bounds(record)
+        window_start = max(lo, s_pos - q_pos)
+        window = db.fetch(window_start, min(hi, s_pos - q_pos + len(query)))
+        q_start, q_end, s_start, s_end, score = _extend_ungapped(
+            strands[strand], window, q_pos, s_pos - window_start, word_size, 0, len(window), reward, penalty, xdrop)
+        extended_to[diagonal] = s_end + window_start
+        if score >= min_ungapped_score:
+            ungapped.append((record, strand, (q_start, q_end, s_start + window_start, s_end + window_start, score)))
+
+    # gapped extension in a window around each HSP, best ungapped HSPs first
+    aligner = _make_gapped_aligner(reward, penalty, gap_open, gap_extend)
+    hsps_by_record = {}
+    seen = set()
+    for record, strand, (q_start, q_end, s_start, s_end, _) in sorted(ungapped, key=lambda x: -x[2][4]):
+        lo, hi = db.bounds(record)
+        window_start = max(lo, s_start - q_start - word_size)
+        window_end = min(hi, s_end + (len(query) - q_end) + word_size)
+        alignment = aligner.align(strands[strand], db.fetch(window_start, window_end))[0]
+        hsp = _make_hsp(alignment, len(query), strand, window_start, lam, kappa, search_space)
+        key = (record, strand, hsp['_s_start'], hsp['_s_end'])
+        if key in seen or hsp['evalue'] > expect:
+            continue
+        seen.add(key)
+
+        s_from, s_to = hsp.pop('_s_start') - lo + 1, hsp.pop('_s_end') - lo
+        hsp['hit_from'], hsp['hit_to'] = (s_from, s_to) if strand == 'Plus' else (s_to, s_from)
+        hsps_by_record.setdefault(record, []).append(hsp)
+
+    hits = []
+    for record, hsps in hsps_by_record.items():
+        hsps.sort(key=lambda hsp: (hsp['evalue'], -hsp['score']))
+        for num, hsp in enumerate(hsps, 1):
+            hsp['num'] = num
+        lo, hi = db.bounds(record)
+        hits.append({
+            'description': [db.description(record)],
+            'len': hi - lo,
+            'hsps': hsps,
+        })
+    hits.sort(key=lambda hit: (hit['hsps'][0]['evalue'], -hit['hsps'][0]['score']))
+    hits = hits[:hitlist_size]
+    for num, hit in enumerate(hits, 1):
+        hit['num'] = num
+    return hits
+
+
+def _hit_key(hit):
+    return hit['hsps'][0]['evalue'], -hit['hsps'][0]['score']
+
+
+class TopHits:
+    """
+    The best 'size' hits seen so far, by e-value and then score of their best hsp.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._heap = []  # (-evalue, score, tiebreak, hit), so the worst hit kept is on top
+        self._counter = itertools.count()
+
+    def add(self, hits):
+        """
+        Offers 'hits' for inclusion, returning whether any of them made it in.
+        """
+        changed = False
+        for hit in hits:
+            evalue, neg_score = _hit_key(hit)
+            entry = (-evalue, -neg_score, -next(self._counter), hit)
+            if len(self._heap) < self.size:
+                heapq.heappush(self._heap, entry)
+                changed = True
+            elif entry[:3] > self._heap[0][:3]:
+                heapq.heapreplace(self._heap, entry)
+                changed = True
+        return changed
+
+    def hits(self):
+        """
+        Returns the hits kept, best first and renumbered.
+        """
+        hits = [entry[3] for entry in sorted(self._heap, reverse=True)]
+        for num, hit in enumerate(hits, 1):
+            hit['num'] = num
+        return hits
+
+
+def shard_bounds(db, num_shards):
+    """
+    Splits the database into at most 'num_shards' ranges of whole records of about the same length.
+    :return: a list of (start, end) positions in the concatenated sequence
+    """
+    cuts = numpy.linspace(0, db.total_length, num_shards + 1)[1:-1].astype(numpy.uint64)
+    # move each cut back to the start of the record it falls into
+    cuts = db.offsets[db.record_at(cuts)] if len(cuts) else cuts
+    edges = sorted(set([0] + [int(cut) for cut in cuts] + [db.total_length]))
+    return list(zip(edges[:-1], edges[1:]))
+
+
+_search_pool = None
+_search_pool_lock = Lock()
+
+
+def _get_search_pool():
+    """
+    Returns the process pool used by search_sharded(), starting it on first use.
+    """
+    global _search_pool
+    with _search_pool_lock:
+        if _search_pool is None:
+            # spawn rather than fork, since the web server's request threads may hold locks
+            _search_pool = ProcessPoolExecutor(
+                max_workers=LOCAL_BLAST_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _search_pool
+
+
+def _discard_search_pool(pool):
+    """
+    Drops 'pool' after it broke, so the next search_sharded() starts a new one.
+    """
+    global _search_pool
+    with _search_pool_lock:
+        if _search_pool is pool:
+            _search_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _search_shard(query, blast_db_dir, start, end, params):
+    # runs in the pool's workers, which map the database themselves
+    return search(query, load_database(blast_db_dir), start, end, params=params)
+
+
+def search_sharded(query, blast_db_dir, params=BLAST_PARAMS):
+    """
+    Searches the database in 'blast_db_dir' for 'query', one shard per task on the worker pool.
+    :return: yields (shards done, number of shards, hits) as the shards finish, where hits are the best hits so far
+    (as returned by search()) if they changed with that shard and None otherwise
+    """
+    db = load_database(blast_db_dir)
+    top_hits = TopHits(int(params.get('HITLIST_SIZE', 100)))
+    num_shards = LOCAL_BLAST_SHARDS or 2 * (LOCAL_BLAST_WORKERS or os.cpu_count() or 1)
+    num_shards = max(1, min(num_shards, db.total_length // LOCAL_BLAST_MIN_SHARD_LENGTH))
+    shards = shard_bounds(db, num_shards)
+
+    if len(shards) <= 1:
+        top_hits.add(search(query, db, params=params))
+        yield 1, 1, top_hits.hits()
+        return
+
+    pool = _get_search_pool()
+    futures = {}  # future -> its shard
+    remaining = list(shards)
+    try:
+        for start, end in shards:
+            futures[pool.submit(_search_shard, query, blast_db_dir, start, end, params)] = (start, end)
+        for future in as_completed(futures):
+            changed = top_hits.add(future.result())
+            remaining.remove(futures[future])
+            yield len(shards) - len(remaining), len(shards), top_hits.hits() if changed else None
+    except BrokenProcessPool:
+        # e.g. a worker died, or couldn't even start; the shards that are left are searched here
+        logger.exception("Search pool broke, searching %d shards in this process", len(remaining))
+        _discard_search_pool(pool)
+        for start, end in list(remaining):
+            changed = top_hits.add(search(query, db, start, end, params=params))
+            remaining.remove((start, end))
+            yield len(shards) - len(remaining), len(shards), top_hits.hits() if changed else None
+    finally:
+        # the client may have gone away; don't leave its shards queued
+        for future in futures:
+            future.cancel()
+
+
+def make_report(query, db, hits, params=BLAST_PARAMS):
+    """
+    Wraps 'hits' in a JSON2_S-like document, as returned by NCBI's FORMAT_TYPE=JSON2_S.
+    """
+    reward, penalty, gap_open, gap_extend = _scoring(params)
+    lam, kappa = KARLIN_ALTSCHUL.get((reward, penalty), KARLIN_ALTSCHUL[(1, -3)])
+    return {
+        'BlastOutput2': [{
+            'report': {
+                'program': 'blastn',
+                'version': 'local',
+                'search_target': {'db': db.name},
+                'params': {
+                    'expect': float(params.get('EXPECT', 10)),
+                    'sc_match': reward,
+                    'sc_mismatch': penalty,
+                    'gap_open': gap_open,
+                    'gap_extend': gap_extend,
+                },
+                'results': {
+                    'search': {
+                        'query_id': 'Query_1',
+                        'query_len': len(query),
+                        'hits': hits,
+                        'stat': {
+                            'db_num': len(db),
+                            'db_len': db.total_length,
+                            'eff_space': len(query) * db.total_length,
+                            'kappa': kappa,
+                            'lambda': lam,
+                        },
+                    }
+                }
+            }
+        }]
+    }
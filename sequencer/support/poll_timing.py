@@ -0,0 +1,69 @@
+"""
+Times the polls of NCBI searches from how long similar searches took.
+
+The time from submitting a search to seeing it READY is recorded per (database, program, BLAST_PARAMS, query length)
+in the app cache, where all processes share it. BLAST_TIMES: is one of CACHE_SHARED_PREFIXES, so record() adds to the
+latest samples on disk rather than to a stale copy in this process's memory. Once there are enough of them, a search
+is first polled just after the first of BLAST_POLL_QUANTILES of those durations, then after each later one; past the
+last, or without enough of them, NCBI's own estimates (RTOE, then "updated in N seconds") are used as before.
+"""
+import hashlib
+import json
+
+from sequencer.cache import cache
+from sequencer.default_settings import (
+    BLAST_PARAMS, BLAST_POLL_QUANTILES, BLAST_TIMING_SAMPLES, BLAST_TIMING_MIN_SAMPLES, MIN_POLL_DELAY_SECS
+)
+
+import logging
+logger = logging.getLogger(__name__)
+
+# query lengths are rounded up to a multiple of this, so similar reads share their durations
+LENGTH_BUCKET = 10
+
+# polls land this long after the chosen quantile, so a search that's done right at it is seen as done
+POLL_MARGIN_SECS = 1
+
+_params_digest = hashlib.sha1(json.dumps(BLAST_PARAMS, sort_keys=True).encode("utf-8")).hexdigest()[:8]
+
+
+def timing_key(database, program, queries):
+    """
+    Returns the key the durations of a search for 'queries' (all the sequences submitted together) are kept under.
+    """
+    length = sum(len(query) for query in queries)
+    bucket = -(-length // LENGTH_BUCKET) * LENGTH_BUCKET
+    return "BLAST_TIMES:%s_%s_%s_%d" % (database, program, _params_digest, bucket)
+
+
+def durations(key):
+    return cache.get(key) or []
+
+
+def record(key, duration):
+    """
+    Adds a search's submit-to-READY duration in seconds, keeping the latest BLAST_TIMING_SAMPLES of them.
+    """
+    # concurrent records may lose one another, which is fine for an estimate
+    samples = (durations(key) + [round(duration, 1)])[-BLAST_TIMING_SAMPLES:]
+    cache.set(key, samples)
+    logger.debug("Search for %s took %.1f seconds (%d samples)", key, duration, len(samples))
+
+
+def quantile(samples, q):
+    ordered = sorted(samples)
+    return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+
+def next_delay(key, elapsed, fallback):
+    """
+    Returns how many seconds from now to poll a search that was submitted 'elapsed' seconds ago, given NCBI's
+    estimate 'fallback'.
+    """
+    samples = durations(key)
+    if len(samples) >= BLAST_TIMING_MIN_SAMPLES:
+        for q in BLAST_POLL_QUANTILES:
+            due = quantile(samples, q) + POLL_MARGIN_SECS
+            if due > elapsed + max(MIN_POLL_DELAY_SECS, POLL_MARGIN_SECS):
+                return due - elapsed
+    return max(fallback, MIN_POLL_DELAY_SECS)
@@ -0,0 +1,234 @@
+"""
+Archive of NCBI's responses to each step of a BLAST search, written in the background.
+
+log() just puts the response on a bounded queue, dropping (and counting) it if the queue is full, so requests never
+wait on the disk. Responses too big to hold twice are compressed by a Recorder as they're downloaded instead, and
+queued once they're complete. A writer thread appends each record, as a gzip member of its own, to the current segment of the
+day, STEP_LOG_DIR/steps-<YYYYMMDD>-<pid>-<n>.gz; a new segment is started each day or once the current one reaches
+STEP_LOG_SEGMENT_BYTES, and the oldest segments are removed when all of them add up to more than STEP_LOG_MAX_BYTES.
+
+Next to each segment, its .idx file has a JSON line per record with its sequence, RID, step, time and where it is
+in the segment; find() and read() use those to look records up. Each record decompresses to a JSON header line
+followed by the response, so 'zcat' works on a segment as a whole, too.
+"""
+import glob
+import gzip
+import json
+import os
+import queue
+import threading
+import zlib
+from time import localtime, strftime, time
+
+from sequencer.default_settings import (
+    STEP_LOG_DIR, STEP_LOG_QUEUE_SIZE, STEP_LOG_SEGMENT_BYTES, STEP_LOG_MAX_BYTES
+)
+
+import logging
+logger = logging.getLogger(__name__)
+
+COMPRESSION_LEVEL = 6
+
+_queue = queue.Queue(maxsize=STEP_LOG_QUEUE_SIZE)
+_counts = {'written': 0, 'dropped': 0, 'failed': 0}
+_lock = threading.Lock()  # guards _counts and _writer
+_writer = None
+
+
+class SegmentWriter:
+    """
+    Appends records to this process's current segment in 'directory', rotating and pruning segments as it goes.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.day = None
+        self.number = 0
+        self.path = None
+        self.data = None
+        self.index = None
+        self.size = 0
+
+    def write(self, when, sequence, rid, step, payload, member=None):
+        """
+        Appends the record of 'payload', or the record a Recorder compressed into 'member' instead.
+        """
+        day = strftime("%Y%m%d", localtime(when))
+        if self.data is None or day != self.day or self.size >= STEP_LOG_SEGMENT_BYTES:
+            self._rotate(day)
+
+        header = {"time": when, "seq": sequence, "rid": rid, "step": step}
+        if member is None:
+            member = gzip.compress(_header_line(header) + payload, COMPRESSION_LEVEL)
+        self.data.write(member)
+        self.data.flush()
+        self.index.write(json.dumps(dict(header, offset=self.size, length=len(member))) + "\n")
+        self.index.flush()
+        self.size += len(member)
+
+    def close(self):
+        if self.data is not None:
+            self.data.close()
+            self.index.close()
+            self.data = self.index = None
+
+    def _rotate(self, day):
+        self.close()
+        if day != self.day:
+            self.day, self.number = day, 0
+        self.number += 1
+        os.makedirs(self.directory, exist_ok=True)
+        self.path = os.path.join(self.directory, "steps-%s-%d-%03d.gz" % (day, os.getpid(), self.number))
+        self.data = open(self.path, "ab")
+        self.index = open(self.path[:-len(".gz")] + ".idx", "a")
+        self.size = self.data.tell()
+        self._prune()
+
+    def _prune(self):
+        """
+        Removes the oldest segments (and their indices) until all of them fit in STEP_LOG_MAX_BYTES.
+        """
+        segments = []
+        for path in glob.glob(os.path.join(self.directory, "steps-*.gz")):
+            index_path = path[:-len(".gz")] + ".idx"
+            try:
+                size = os.path.getsize(path) + (os.path.getsize(index_path) if os.path.exists(index_path) else 0)
+                segments.append((os.path.getmtime(path), size, path, index_path))
+            except OSError:
+                continue
+
+        total = sum(size for _, size, _, _ in segments)
+        for _, size, path, index_path in sorted(segments):
+            if total <= STEP_LOG_MAX_BYTES:
+                break
+            if path == self.path:
+                continue
+            for removed in (path, index_path):
+                try:
+                    os.remove(removed)
+                except OSError:
+                    pass
+            total -= size
+            logger.info("Removed step log segment %s", path)
+
+
+def _header_line(header):
+    return json.dumps(header).encode("utf-8") + b"\n"
+
+
+def _run_writer(writer):
+    while True:
+        record = _queue.get()
+        try:
+            writer.write(*record)
+            counter = 'written'
+        except Exception:
+            logger.exception("Can't write step log record")
+            writer.close()
+            counter = 'failed'
+        with _lock:
+            _counts[counter] += 1
+        _queue.task_done()
+
+
+def _start():
+    global _writer
+    with _lock:
+        if _writer is None:
+            _writer = threading.Thread(
+                target=_run_writer, args=(SegmentWriter(STEP_LOG_DIR),), name='step-log-writer', daemon=True
+            )
+            _writer.start()
+
+
+def log(sequence, step, payload, rid=None):
+    """
+    Queues the response 'payload' (bytes) to step 'step' of the search for 'sequence' to be archived, returning
+    whether it was queued; it's dropped if the queue is full.
+    """
+    return _put((time(), sequence, rid, step, payload))
+
+
+class Recorder:
+    """
+    Compresses a response into its record as it arrives, chunk by chunk, so the whole of it is never held; close()
+    queues the record like log() does.
+    """
+
+    def __init__(self, sequence, step, rid=None):
+        self.record = (time(), sequence, rid, step)
+        self.compressor = zlib.compressobj(COMPRESSION_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # a gzip member
+        header = {"time": self.record[0], "seq": sequence, "rid": rid, "step": step}
+        self.parts = [self.compressor.compress(_header_line(header))]
+
+    def write(self, chunk):
+        self.parts.append(self.compressor.compress(chunk))
+
+    def close(self):
+        """
+        Queues the record, returning whether it was queued.
+        """
+        self.parts.append(self.compressor.flush())
+        member, self.parts = b"".join(self.parts), None
+        return _put(self.record + (None, member))
+
+
+def _put(record):
+    _start()
+    try:
+        _queue.put_nowait(record)
+        return True
+    except queue.Full:
+        with _lock:
+            _counts['dropped'] += 1
+            dropped = _counts['dropped']
+        # only now and then, so a backlog doesn't flood the log
+        if dropped & (dropped - 1) == 0:
+            logger.warning("Step log queue is full, %d responses dropped so far", dropped)
+        return False
+
+
+def flush():
+    """
+    Waits until everything queued so far has been written.
+    """
+    if _writer is not None:
+        _queue.join()
+
+
+def stats():
+    with _lock:
+        return dict(_counts, queued=_queue.qsize())
+
+
+def find(sequence=None, rid=None, directory=None):
+    """
+    Yields the index entries of the records for 'sequence' and/or 'rid', oldest segment first; each has the path of
+    its 'segment' added, for read().
+    """
+    for index_path in sorted(glob.glob(os.path.join(directory or STEP_LOG_DIR, "steps-*.idx"))):
+        try:
+            with open(index_path) as fp:
+                lines = fp.readlines()
+        except OSError:
+            continue
+        for line in lines:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # the writer may be halfway through the last line
+                continue
+            if (sequence is None or entry["seq"] == sequence) and (rid is None or entry["rid"] == rid):
+                entry["segment"] = index_path[:-len(".idx")] + ".gz"
+                yield entry
+
+
+def read(entry):
+    """
+    Returns the response that an entry from find() refers to, as bytes.
+    """
+    with open(entry["segment"], "rb") as fp:
+        fp.seek(entry["offset"])
+        member = fp.read(entry["length"])
+    _, payload = gzip.decompress(member).split(b"\n", 1)
+    return payload
@@ -0,0 +1,62 @@
+import itertools
+
+import pytest
+
+from sequencer import create_app, default_settings
+from sequencer.cache import TieredCache
+from sequencer.support import example_table
+
+TEST_CONFIG = {
+    'TESTING': True,
+    'GCE_KEY': 'test',
+    'GCE_PROJECT_CX': 'test',
+}
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """
+    The app, with a test config and its instance folder in tmp_path.
+    """
+    # the example table isn't needed, and would take minutes to build
+    monkeypatch.setattr(example_table, 'USE_EXAMPLE_TABLE', False)
+    return create_app(TEST_CONFIG, instance_path=str(tmp_path / 'instance'))
+
+
+@pytest.fixture
+def make_process_caches(tmp_path):
+    """
+    Returns a function making two caches on one directory, standing in for two processes; they're configured like
+    the app's, except for the TieredCache arguments it's given.
+    """
+    def make(**kwargs):
+        settings = dict(ttls=default_settings.CACHE_TTLS, memory_ttl=default_settings.CACHE_MEMORY_TTL_SECS,
+                        shared_prefixes=default_settings.CACHE_SHARED_PREFIXES)
+        settings.update(kwargs)
+        return [
+            TieredCache(str(tmp_path), memory_bytes=1024 * 1024, disk_bytes=1024 * 1024, eviction_interval=0,
+                        **settings)
+            for _ in range(2)
+        ]
+    return make
+
+
+@pytest.fixture
+def process_caches(make_process_caches):
+    """
+    Two caches on one directory, configured like the app's, standing in for two processes.
+    """
+    return make_process_caches()
+
+
+@pytest.fixture
+def write_alternately(process_caches, monkeypatch):
+    """
+    Returns a function calling write(value) for each of 'values', as the two processes of process_caches in turn:
+    each time, 'module.cache' is the cache of the process whose turn it is.
+    """
+    def write_all(module, write, values):
+        for process, value in zip(itertools.cycle(process_caches), values):
+            monkeypatch.setattr(module, 'cache', process)
+            write(value)
+    return write_all
@@ -0,0 +1,90 @@
+"""
+Tests for the example matching in support.alignment.
+"""
+import itertools
+import random
+
+import pytest
+
+from sequencer.support import alignment
+
+_SWAP = {"A": "C", "C": "G", "G": "T", "T": "A"}
+
+
+def _substitute(read, positions):
+    return "".join(_SWAP[base] if i in positions else base for i, base in enumerate(read))
+
+
+def test_three_substitutions_match():
+    # no 8 bases in a row are left intact, which contiguous 8-mer seeds would need
+    read = _substitute(alignment.REFERENCES["CFTR"][1000:1028], {7, 14, 21})
+    assert ("CFTR", "Plus") in alignment.find_seed_candidates(read)
+
+    name, aln, strand = alignment.find_best_match(read)
+    assert (name, strand) == ("CFTR", "Plus")
+    assert aln.score == 22
+    assert aln.coordinates[1, 1] == 1000
+
+
+def test_three_substitutions_match_on_minus_strand():
+    read = _substitute(alignment.REFERENCES["EGFR"][2000:2028], {7, 14, 21})
+    name, _, strand = alignment.find_best_match(alignment.reverse_complement(read))
+    assert (name, strand) == ("EGFR", "Minus")
+
+
+def test_any_three_substitutions_in_a_read_leave_a_seed():
+    window = alignment.REFERENCES["Warfarin VKORC1"][100:122]
+    for positions in itertools.combinations(range(len(window)), 3):
+        read = _substitute(window, set(positions))
+        assert ("Warfarin VKORC1", "Plus") in alignment.find_seed_candidates(read), positions
+
+
+def test_unrelated_read_is_general_without_aligning(monkeypatch):
+    def score(*args):
+        raise AssertionError("aligned a read without seeds")
+
+    monkeypatch.setattr(alignment.aligner, "score", score)
+    read = "ACGT" * 7
+    assert not alignment.find_seed_candidates(read)
+    assert alignment.find_best_match(read)[0] == "general"
+
+
+@pytest.mark.parametrize("read, expected", [
+    (alignment.REFERENCES["CFTR"][600:622], "CFTR"),
+    # seeds on EGFR by chance, but doesn't align well enough to match
+    ("GGTCGATCAGCAGTGGTAATTG", "general"),
+])
+def test_reverse_strand_is_only_aligned_when_it_seeds(monkeypatch, read, expected):
+    assert [strand for _, strand in alignment.find_seed_candidates(read)] == ["Plus"]
+
+    aligned = []
+    score = alignment.aligner.score
+    monkeypatch.setattr(alignment.aligner, "score", lambda seq, ref: aligned.append(seq) or score(seq, ref))
+    assert alignment.find_best_match(read)[0] == expected
+    assert aligned and alignment.reverse_complement(read) not in aligned
+
+
+def test_only_the_best_candidate_is_traced_back(monkeypatch):
+    read = alignment.REFERENCES["CFTR"][0:22]
+    assert len(alignment.find_seed_candidates(read)) > 1
+
+    traced = []
+    align = alignment.aligner.align
+    monkeypatch.setattr(alignment.aligner, "align", lambda seq, ref: traced.append(ref) or align(seq, ref))
+    name, aln, _ = alignment.find_best_match(read)
+    assert name == "CFTR" and aln.score == 22
+    assert len(traced) == 1
+
+
+def test_translate_batch_matches_biopython():
+    from Bio.Seq import translate
+
+    codons = ["".join(codon) for codon in itertools.product("TCAG", repeat=3)]
+    ambiguous = ["".join(codon) for codon in itertools.product(alignment.AMBIGUOUS_BASES, repeat=3)]
+    rng = random.Random(0)
+    reads = ["".join(rng.choice("ACGT") for _ in range(rng.randrange(0, 40))) for _ in range(200)]
+    reads += ["".join(rng.choice("ACGTN") for _ in range(30)) for _ in range(50)]
+
+    seqs = codons + ambiguous + [read.lower() for read in reads[:20]] + reads
+    expected = [translate(seq[:len(seq) // 3 * 3]) for seq in seqs]
+    assert alignment.translate_batch(seqs) == expected
@@ -0,0 +1,59 @@
+"""
+Tests for the validation of requests to the API.
+"""
+import pytest
+
+from sequencer import api
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+class _Job:
+    def as_dict(self):
+        return {'id': 'job'}
+
+
+@pytest.mark.parametrize('query_id', ['abc', '-1', '1.5', 1.5, True, [1], {'id': 1}])
+def test_blast_job_with_a_bad_query_id_is_rejected(client, monkeypatch, query_id):
+    monkeypatch.setattr(api.blast_jobs, 'submit', lambda *args, **kwargs: pytest.fail('submitted'))
+    response = client.post('/api/blast/jobs', json={'sequence': 'ACGT', 'query_id': query_id})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('payload', [{'json': {'sequence': 'ACGT', 'query_id': 12}},
+                                     {'json': {'sequence': 'ACGT', 'query_id': '12'}},
+                                     {'data': {'sequence': 'ACGT', 'query_id': '12'}}])
+def test_blast_job_query_id_is_passed_on(client, monkeypatch, payload):
+    submitted = []
+    monkeypatch.setattr(api.blast_jobs, 'submit',
+                        lambda sequence, lang, query_id: submitted.append(query_id) or _Job())
+    response = client.post('/api/blast/jobs', **payload)
+    assert response.status_code == 202
+    assert submitted == [12]
+
+
+@pytest.mark.parametrize('payload', [{'json': ['ACGT']}, {'json': {'sequence': 42}}, {'data': 'not json'}])
+def test_blast_job_without_a_sequence_is_rejected(client, payload):
+    assert client.post('/api/blast/jobs', **payload).status_code == 400
+
+
+@pytest.mark.parametrize('payload', [{'data': 'not json', 'content_type': 'application/json'},
+                                     {'data': 'reads=ACGT'},
+                                     {'json': ['ACGT']},
+                                     {'json': {'reads': 'ACGT'}},
+                                     {'json': {'reads': ['ACGT', 42]}},
+                                     {'json': {'reads': [None]}}])
+def test_align_batch_with_bad_reads_is_rejected(client, monkeypatch, payload):
+    monkeypatch.setattr(api, 'query_sequences', lambda reads: pytest.fail('aligned'))
+    response = client.post('/api/align_batch', **payload)
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'must specify a list of reads'}
+
+
+def test_align_batch_aligns_reads(client):
+    response = client.post('/api/align_batch', json={'reads': ['ACGT']})
+    assert response.status_code == 200
+    assert response.get_json()['results'][0]['example'] == 'general'
@@ -0,0 +1,18 @@
+from sequencer.support import blast_cache
+
+SEQUENCES = ["ACGTTGCAACGTTGCA", "TTGCAACGTTGCAACG", "GCAACGTTGCAACGTT", "CAACGTTGCAACGTTG"]
+
+
+def test_sequences_from_other_processes_are_kept(write_alternately, process_caches, monkeypatch):
+    monkeypatch.setattr(blast_cache, "_indices", {})
+    write_alternately(blast_cache, lambda sequence: blast_cache._remember(
+        blast_cache.cache_key(sequence, "nr", "megablast")), SEQUENCES)
+
+    assert process_caches[0].get(blast_cache._sequences_key("nr_megablast")) == SEQUENCES
+
+    # and a process indexing them afresh finds each of them near a misread of it
+    monkeypatch.setattr(blast_cache, "_indices", {})
+    index = blast_cache._index("nr_megablast")
+    for sequence in SEQUENCES:
+        misread = sequence[:-1] + ("A" if sequence[-1] != "A" else "C")
+        assert (1, sequence) in index.find(misread)
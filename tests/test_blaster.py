@@ -0,0 +1,63 @@
+import gzip
+import os
+from time import time
+
+from sequencer.support import blaster, step_log
+from sequencer.support.blast_jobs import Wait
+
+
+def _events(batch):
+    return list(blaster.await_batch(batch, 0, "BLAST:key", "en", log_step=lambda *args, **kwargs: None))
+
+
+def _finished_batch(state):
+    batch = blaster.BlastBatch("nr", "megablast", 60, 0)
+    batch.state, batch.rid, batch.rtoe = state, "RID1", 30
+    batch.next_poll = time() + 30
+    return batch
+
+
+def test_finished_batch_is_not_announced_as_waiting():
+    for state in ("no_hits", "timeout"):
+        events = _events(_finished_batch(state))
+        assert not any(isinstance(event, Wait) for event in events)
+        assert not any("job_id" in event for event in events)
+        assert len(events) == 1
+
+
+def test_waiting_batch_is_announced():
+    batch = _finished_batch("waiting")
+    steps = blaster.await_batch(batch, 0, "BLAST:key", "en", log_step=lambda *args, **kwargs: None)
+    assert next(steps)["job_id"] == "RID1"
+    assert isinstance(next(steps), Wait)
+
+
+class _Response:
+    def __init__(self, body):
+        self.body = body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def iter_content(self, size):
+        for start in range(0, len(self.body), size):
+            yield self.body[start:start + size]
+
+
+def test_fetched_results_are_streamed_to_the_step_log(monkeypatch):
+    with open(os.path.join(os.path.dirname(blaster.__file__), "..", "mockdata", "canned_blast.json"), "rb") as fp:
+        body = fp.read()
+    monkeypatch.setattr(blaster.http_client, "get", lambda *args, **kwargs: _Response(body))
+    monkeypatch.setattr(blaster, "FETCH_CHUNK_SIZE", 1024)
+    records = []
+    monkeypatch.setattr(step_log, "_put", lambda record: records.append(record) or True)
+
+    events = list(blaster.fetch_blast("RID1", blaster._StepLogger("ACGT")))
+
+    assert events[-1][0] == "document"
+    (when, sequence, rid, step, payload, member), = records
+    assert (sequence, rid, step, payload) == ("ACGT", "RID1", "result", None)
+    assert gzip.decompress(member).split(b"\n", 1)[1] == body
@@ -0,0 +1,37 @@
+import sys
+from time import time
+
+from sequencer import default_settings
+
+# the package's 'cache' attribute is the app's Cache, which hides the module of the same name
+cache_module = sys.modules['sequencer.cache']
+
+
+def test_shared_prefixes_see_other_processes_writes(process_caches):
+    first, second = process_caches
+    key = default_settings.CACHE_SHARED_PREFIXES[0] + 'x'
+    first.set(key, [1])
+    assert second.get(key) == [1]
+    first.set(key, [1, 2])
+    assert second.get(key) == [1, 2]
+    assert not second.memory.entries
+
+
+def test_memory_copies_expire_after_memory_ttl(process_caches, monkeypatch):
+    first, second = process_caches
+    first.set('KEY:x', 'old')
+    assert second.get('KEY:x') == 'old'
+    first.set('KEY:x', 'new')
+    assert second.get('KEY:x') == 'old'
+
+    now = time()
+    monkeypatch.setattr(cache_module, 'time', lambda: now + default_settings.CACHE_MEMORY_TTL_SECS + 1)
+    assert second.get('KEY:x') == 'new'
+
+
+def test_memory_copies_keep_shorter_ttls(make_process_caches):
+    cache, _ = make_process_caches(memory_ttl=60, ttls={'SHORT:': 10})
+    cache.set('SHORT:x', 1)
+    cache.set('LONG:x', 1, timeout=3600)
+    expires = {key: entry[0] for key, entry in cache.memory.entries.items()}
+    assert expires['SHORT:x'] < expires['LONG:x']
@@ -0,0 +1,130 @@
+import threading
+from time import time
+
+import pytest
+
+from sequencer.support import ev3_reader
+
+
+@pytest.fixture
+def unreachable(monkeypatch):
+    """
+    Makes connecting to the brick hang until the returned Event is set, then fail.
+    """
+    release = threading.Event()
+
+    def connect(host):
+        release.wait(10)
+        raise OSError("timed out")
+
+    monkeypatch.setattr(ev3_reader.rpyc.classic, "connect", connect)
+    yield release
+    release.set()
+
+
+def _connection():
+    connection = ev3_reader.EV3Connection("ev3dev.invalid")
+    connection.heartbeat = object()  # no heartbeat thread, the test drives the connection
+    return connection
+
+
+def _get_in_thread(connection, errors):
+    def get():
+        try:
+            connection.get()
+        except ev3_reader.FatalDisconnectException as ex:
+            errors.append(ex)
+
+    thread = threading.Thread(target=get, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_health_does_not_wait_for_a_connection_attempt(unreachable):
+    connection = _connection()
+    errors = []
+    thread = _get_in_thread(connection, errors)
+    while not connection.health()["connecting"]:
+        assert thread.is_alive()
+
+    started = time()
+    state = connection.health()
+    assert time() - started < 0.5
+    assert not state["connected"]
+
+    unreachable.set()
+    thread.join(5)
+    assert len(errors) == 1
+    assert connection.health()["failures"] == 1
+    assert not connection.health()["connecting"]
+
+
+def test_concurrent_gets_share_one_attempt(unreachable, monkeypatch):
+    connection = _connection()
+    attempts = []
+    connect = ev3_reader.rpyc.classic.connect
+    monkeypatch.setattr(ev3_reader.rpyc.classic, "connect", lambda host: attempts.append(host) or connect(host))
+
+    errors = []
+    threads = [_get_in_thread(connection, errors)]
+    while not connection.health()["connecting"]:
+        pass
+    threads += [_get_in_thread(connection, errors) for _ in range(3)]
+
+    unreachable.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(attempts) == 1
+    assert len(errors) == 4
+
+
+class _Motor:
+    def __init__(self, fail):
+        self.fail = fail
+
+    def run_to_rel_pos(self, **kwargs):
+        if self.fail:
+            raise EOFError("connection closed by peer")
+
+
+class _Brick:
+    """
+    A connection whose motors fail over the first 'dead' connections made.
+    """
+
+    def __init__(self, dead):
+        self.dead = dead
+        self.connects = 0
+
+    def connect(self, host):
+        self.connects += 1
+        fail = self.connects <= self.dead
+
+        class Conn:
+            modules = {"ev3dev.ev3": type("ev3", (), {"LargeMotor": staticmethod(lambda port: _Motor(fail))})}
+
+            def close(self):
+                pass
+
+        return Conn()
+
+
+def test_nudge_reconnects_once_after_losing_the_connection(monkeypatch):
+    brick = _Brick(dead=1)
+    monkeypatch.setattr(ev3_reader.rpyc.classic, "connect", brick.connect)
+    monkeypatch.setattr(ev3_reader, "g_connection", _connection())
+
+    assert ev3_reader.nudge("right")["msg"] == "nudged %s degrees" % ev3_reader.BRICK_DEG
+    assert brick.connects == 2
+
+
+def test_nudge_gives_up_after_the_retry(monkeypatch):
+    brick = _Brick(dead=5)
+    monkeypatch.setattr(ev3_reader.rpyc.classic, "connect", brick.connect)
+    monkeypatch.setattr(ev3_reader, "g_connection", _connection())
+
+    with pytest.raises(ev3_reader.FatalDisconnectException):
+        ev3_reader.nudge("left")
+    assert brick.connects == 2
+    # and the backoff applies again after that
+    assert ev3_reader.g_connection.next_attempt > time()
@@ -0,0 +1,54 @@
+"""
+Tests for the precomputed example matches in support.example_table.
+"""
+import itertools
+
+from sequencer import default_settings
+from sequencer.support import alignment, example_table
+
+_SWAP = {"A": "C", "C": "G", "G": "T", "T": "A"}
+
+
+def _fail(*args, **kwargs):
+    raise AssertionError("the read was matched rather than looked up")
+
+
+def test_one_substitution_read_is_served_from_the_table(monkeypatch):
+    windows = [alignment.REFERENCES[name][300:322] for name in ("CFTR", "EGFR")]
+    monkeypatch.setattr(example_table, "_windows", lambda read_length: iter(windows))
+    table = example_table.build_table(read_lengths=(22,), max_substitutions=1, max_bytes=1 << 20)
+    assert len(table) == 2 * (1 + 22 * 3)
+
+    read = windows[1][:10] + _SWAP[windows[1][10]] + windows[1][11:]
+    expected = alignment._query_sequence(read)
+    assert expected[0] != "general"
+
+    monkeypatch.setattr(alignment, "EXAMPLE_TABLE", table)
+    monkeypatch.setattr(alignment, "find_best_match", _fail)
+    monkeypatch.setattr(alignment, "find_match", _fail)
+    assert read in table
+    assert alignment._query_sequence(read) == expected
+
+
+def test_reads_outside_the_table_are_not_in_it():
+    table = example_table.ExampleTable([example_table._pack_read("ACGT")], [0], ["CFTR"])
+    assert "ACGT" in table
+    for read in ("ACG", "ACGTA", "ACGN", "A" * (example_table.MAX_READ_LENGTH + 1)):
+        assert read not in table
+
+
+def test_matches_are_packed_losslessly():
+    names = list(alignment.REFERENCES)
+    matches = [None, (names[0], "Plus", 0, 22), (names[-1], "Minus", 123456, 123484)]
+    reads = ["".join(bases) for bases in itertools.islice(itertools.product("ACGT", repeat=22), len(matches))]
+    table = example_table.ExampleTable(
+        [example_table._pack_read(read) for read in reads],
+        [example_table._pack_match(match, names) for match in matches],
+        names)
+    assert [table[read] for read in reads] == matches
+
+
+def test_one_substitution_level_fits_the_default_budget():
+    estimate = sum(example_table._count_reads(default_settings.EXAMPLE_TABLE_READ_LENGTHS, count)
+                   for count in range(2)) * example_table.ENTRY_BYTES
+    assert estimate <= default_settings.EXAMPLE_TABLE_MAX_BYTES
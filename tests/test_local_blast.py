@@ -0,0 +1,37 @@
+"""
+Tests for the sharded local BLAST search in support.local_blast.
+"""
+import random
+from concurrent.futures.process import BrokenProcessPool
+
+from sequencer.support import blast_db, local_blast
+
+
+class _BrokenPool:
+    def submit(self, *args, **kwargs):
+        raise BrokenProcessPool("a child process terminated abruptly")
+
+    def shutdown(self, *args, **kwargs):
+        pass
+
+
+def test_broken_pool_searches_the_shards_in_process(tmp_path, monkeypatch):
+    rng = random.Random(0)
+    records = ["".join(rng.choice("ACGT") for _ in range(2000)) for _ in range(8)]
+    fasta = tmp_path / "records.fasta"
+    fasta.write_text("".join(">seq%d\n%s\n" % (i, record) for i, record in enumerate(records)))
+    db_dir = str(tmp_path / "db")
+    blast_db.build_database([str(fasta)], db_dir)
+
+    monkeypatch.setattr(local_blast, "LOCAL_BLAST_SHARDS", 4)
+    monkeypatch.setattr(local_blast, "LOCAL_BLAST_MIN_SHARD_LENGTH", 1)
+    monkeypatch.setattr(local_blast, "_get_search_pool", _BrokenPool)
+
+    query = records[5][100:160]
+    progress = list(local_blast.search_sharded(query, db_dir))
+
+    done, num_shards, _ = progress[-1]
+    assert num_shards > 1 and done == num_shards
+    hits = [hits for _, _, hits in progress if hits is not None][-1]
+    expected = local_blast.search(query, blast_db.load_database(db_dir))
+    assert hits[0]["description"] == expected[0]["description"]
@@ -0,0 +1,8 @@
+from sequencer.support import poll_timing
+
+
+def test_records_from_other_processes_are_kept(write_alternately):
+    key = poll_timing.timing_key("nr", "megablast", ["ACGT" * 5])
+    write_alternately(poll_timing, lambda duration: poll_timing.record(key, duration), [10, 20, 30, 40])
+
+    assert poll_timing.durations(key) == [10, 20, 30, 40]
@@ -0,0 +1,29 @@
+import os
+
+from sequencer.support import step_log
+
+
+def _queued(monkeypatch):
+    records = []
+    monkeypatch.setattr(step_log, "_put", lambda record: records.append(record) or True)
+    return records
+
+
+def test_recorded_response_reads_back_like_a_logged_one(tmp_path, monkeypatch):
+    records = _queued(monkeypatch)
+    payload = os.urandom(1000) + b'{"BlastOutput2": []}' * 5000
+
+    step_log.log("ACGT", "poll", payload, rid="RID1")
+    recorder = step_log.Recorder("ACGT", "result", rid="RID1")
+    for start in range(0, len(payload), 4096):
+        recorder.write(payload[start:start + 4096])
+    assert recorder.close()
+
+    writer = step_log.SegmentWriter(str(tmp_path))
+    for record in records:
+        writer.write(*record)
+    writer.close()
+
+    entries = list(step_log.find(rid="RID1", directory=str(tmp_path)))
+    assert [entry["step"] for entry in entries] == ["poll", "result"]
+    assert [step_log.read(entry) for entry in entries] == [payload, payload]
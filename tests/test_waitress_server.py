@@ -0,0 +1,47 @@
+"""
+Serves the app with waitress, as waitress_server.py does, and sends it a batch big enough for the worker pool.
+"""
+import os
+import random
+import runpy
+import threading
+
+import pytest
+import requests
+import waitress
+
+from sequencer.support import alignment
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def server(app):
+    # port 0 picks a free one
+    server = waitress.create_server(app, host='127.0.0.1', port=0, threads=16)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    try:
+        yield 'http://127.0.0.1:%s' % server.effective_port
+    finally:
+        server.close()
+        thread.join(10)
+
+
+def test_align_batch_uses_the_pool(server, caplog):
+    rng = random.Random(0)
+    reads = [''.join(rng.choice('ACGT') for _ in range(28)) for _ in range(4 * alignment.QUERY_POOL_MIN_CHUNK)]
+
+    response = requests.post(server + '/api/align_batch', json={'reads': reads}, timeout=120)
+
+    assert response.status_code == 200
+    assert len(response.json()['results']) == len(reads)
+    assert 'Query pool broke' not in caplog.text
+
+
+def test_pool_workers_dont_start_a_server(monkeypatch):
+    # the pool's workers are started with 'spawn', which imports waitress_server.py again under this name
+    def serve(*args, **kwargs):
+        raise AssertionError('a worker started a server')
+    monkeypatch.setattr(waitress, 'serve', serve)
+    runpy.run_path(os.path.join(ROOT, 'waitress_server.py'), run_name='__mp_main__')
@@ -2,4 +2,7 @@
 
 from waitress import serve
 from sequencer import create_app
-serve(create_app(), host='0.0.0.0', port=5000, threads=16)
+
+# the worker pools start their processes with 'spawn', which imports this module again in each of them
+if __name__ == "__main__":
+    serve(create_app(), host='0.0.0.0', port=5000, threads=16)